@@ -0,0 +1,123 @@
+"""Column-backed aggregation over showtime records.
+
+Records are loaded once into typed ``array`` columns, and every group key
+(the breakdown dimensions and the show key) is factorized into integer codes
+in the same single pass over the records.  Group-bys are then tight loops over
+ints and floats that sum every numeric column at once, and all breakdowns are
+accumulated together in one more pass over the codes.
+"""
+
+from array import array
+
+NUMERIC = {
+    "sold": ("totalSeatSold", "q"),
+    "capacity": ("totalSeatCount", "q"),
+    "gross": ("grossRevenueUSD", "d"),
+    "gross_with_fee": ("totalRevenueWithFee", "d"),
+}
+# Breakdown name -> record fields making up the group key.
+DIMENSIONS = {
+    "theater": ("theater_name",),
+    "chain": ("chainName",),
+    "state": ("state",),
+    "city": ("state", "city"),
+    "format": ("format",),
+    "language": ("language",),
+}
+# One show in grouped.json: a theater's start time in one language, all formats.
+SHOW_KEY = ("theater_name", "date", "language")
+# Group keys factorized when the columns are built.
+KEYS = (*DIMENSIONS.values(), SHOW_KEY)
+
+
+class Columns:
+    def __init__(self, records, keys=KEYS):
+        self.records = records
+        self.n = len(records)
+        for name, (field, typecode) in NUMERIC.items():
+            setattr(self, name, array(typecode, (r[field] for r in records)))
+        self._codes = {}
+        self._factorize(keys)
+
+    def _factorize(self, keys):
+        """Factorize every key not seen yet in one pass over the records."""
+        keys = [fields for fields in dict.fromkeys(tuple(k) for k in keys) if fields not in self._codes]
+        if not keys:
+            return
+        indexes = [{} for _ in keys]
+        codes = [array("l", bytes(self.n * array("l").itemsize)) for _ in keys]
+        for i, r in enumerate(self.records):
+            for fields, index, out in zip(keys, indexes, codes):
+                out[i] = index.setdefault(tuple(r[f] for f in fields), len(index))
+        for fields, index, out in zip(keys, indexes, codes):
+            self._codes[fields] = (out, list(index))
+
+    def factorize(self, fields):
+        """``(codes, labels)`` for the key made of ``fields``, labels in first-seen order."""
+        fields = tuple(fields)
+        self._factorize([fields])
+        return self._codes[fields]
+
+    def group_sums_by(self, keys):
+        """``{fields: (labels, counts, sums)}`` for every key, accumulated in one pass over the rows.
+
+        ``sums`` has one list per :data:`NUMERIC` column, in that order.
+        """
+        keys = list(dict.fromkeys(tuple(k) for k in keys))
+        self._factorize(keys)
+        groups = []
+        for fields in keys:
+            codes, labels = self._codes[fields]
+            groups.append((codes, *([0] * len(labels) for _ in range(1 + len(NUMERIC)))))
+        for i, (s, c, g, f) in enumerate(zip(self.sold, self.capacity, self.gross, self.gross_with_fee)):
+            for codes, counts, sold, capacity, gross, gross_fee in groups:
+                code = codes[i]
+                counts[code] += 1
+                sold[code] += s
+                capacity[code] += c
+                gross[code] += g
+                gross_fee[code] += f
+        return {
+            fields: (self._codes[fields][1], group[1], list(group[2:]))
+            for fields, group in zip(keys, groups)
+        }
+
+    def group_sums(self, fields, columns=tuple(NUMERIC)):
+        """Per-group sums of numeric ``columns`` plus a row count, one list per column.
+
+        Every numeric column and the count are summed in the same single pass
+        over the group codes.
+        """
+        fields = tuple(fields)
+        labels, counts, sums = self.group_sums_by([fields])[fields]
+        by_name = dict(zip(NUMERIC, sums))
+        return labels, counts, [by_name[name] for name in columns]
+
+    def total(self, name):
+        return sum(getattr(self, name))
+
+
+def _breakdown(labels, counts, sums):
+    sold, capacity, gross, gross_fee = sums
+    result = {}
+    for i, key in enumerate(labels):
+        label = " / ".join(str(k) for k in key)
+        result[label] = {
+            "total_gross_usd": round(gross[i], 2),
+            "total_gross_with_fee": round(gross_fee[i], 2),
+            "total_shows": counts[i],
+            "tickets_sold": sold[i],
+            "total_capacity": capacity[i],
+            "avg_occupancy": round(100 * sold[i] / capacity[i], 2) if capacity[i] else 0.0,
+        }
+    return dict(sorted(result.items(), key=lambda item: -item[1]["total_gross_usd"]))
+
+
+def breakdown(cols, fields):
+    return _breakdown(*cols.group_sums(fields))
+
+
+def breakdowns(cols, dimensions=DIMENSIONS):
+    """Gross/sold/occupancy per theater, chain, state, city, format and language, in one pass."""
+    sums = cols.group_sums_by(dimensions.values())
+    return {name: _breakdown(*sums[tuple(fields)]) for name, fields in dimensions.items()}
@@ -0,0 +1,177 @@
+"""Offline benchmark of the fetch pipeline against mockserver.py.
+
+By default the synthetic API is built from every target's snapshot store, scaled
+and served in-process, and ``pipeline.py`` (theater index refresh plus the
+showtime/seat-map sweep) runs against it.  With ``--usa`` the obfuscated
+usa.py is run instead, in a scratch copy of the repo, with every request sent
+to the mock server through ``record.py --replay``; client-side latency isn't
+visible in that mode, so only server-side counts are reported.
+
+    python bench.py --scale 10 --latency 60 --jitter 40 --rate-500 0.01 --fail-match AMC --out bench.json
+    python bench.py --scale 10 --latency 60 --jitter 40 --baseline bench.json
+    python bench.py --usa --fixtures fixtures/live --latency 60
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+
+from common import ROOT
+from mockserver import MockSource, add_server_args, app_from_args, expand, target_folder
+from pipeline import Target, sweep
+from ratelimit import ThrottledSession
+from theater_index import TheaterIndex, refresh
+
+DEFAULT_MAIN = os.path.join(ROOT, "data", "*", "*", "")
+# Metrics where a bigger number is better when comparing against a baseline.
+HIGHER_IS_BETTER = {"requests_per_sec"}
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q / 100 * len(ordered)))]
+
+
+def latency_trace(latencies):
+    trace = aiohttp.TraceConfig()
+
+    async def on_start(session, ctx, params):
+        ctx.start = time.monotonic()
+
+    async def on_end(session, ctx, params):
+        latencies.append(1000 * (time.monotonic() - ctx.start))
+
+    trace.on_request_start.append(on_start)
+    trace.on_request_end.append(on_end)
+    trace.on_request_exception.append(on_end)
+    return trace
+
+
+def targets_from(main_paths):
+    targets = []
+    for path in main_paths:
+        folder = target_folder(path)
+        day = os.path.basename(folder)
+        movie_id = os.path.basename(os.path.dirname(folder))
+        targets.append(Target(movie_id, f"{day[:4]}-{day[4:6]}-{day[6:]}"))
+    return targets
+
+
+async def start_server(args):
+    runner = web.AppRunner(app_from_args(args))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return runner, f"http://{host}:{port}"
+
+
+async def bench_pipeline(args, url):
+    latencies = []
+    source = MockSource(url)
+    targets = targets_from(expand(args.main))
+    with tempfile.TemporaryDirectory() as scratch:
+        index = TheaterIndex(os.path.join(scratch, "theaters.json"))
+        start = time.monotonic()
+        async with ThrottledSession(trace_configs=[latency_trace(latencies)]) as session:
+            async with session.get(f"{url}/mock/zips") as resp:
+                zips = await resp.json()
+            await refresh(index, zips, source.lookup_theaters, session)
+            results, _ = await sweep(session, source, index.all_theaters(), targets)
+            wall = time.monotonic() - start
+            retries, hosts = session.retried, session.stats()
+    records = [r for rs in results.values() for r in rs]
+    return {
+        "wall_time_s": round(wall, 3),
+        "requests": len(latencies),
+        "requests_per_sec": round(len(latencies) / wall, 1) if wall else None,
+        "latency_p50_ms": round(percentile(latencies, 50), 1) if latencies else None,
+        "latency_p99_ms": round(percentile(latencies, 99), 1) if latencies else None,
+        "retries": retries,
+        "theaters": len(index.all_theaters()),
+        "showtimes": len(records),
+        "errors": sum("error" in r for r in records),
+        "hosts": hosts,
+    }
+
+
+async def bench_usa(url):
+    with tempfile.TemporaryDirectory() as scratch:
+        for name in ("usa.py", "zipcodes.txt", "pyarmor_runtime_000000"):
+            src = os.path.join(ROOT, name)
+            if os.path.isdir(src):
+                shutil.copytree(src, os.path.join(scratch, name))
+            elif os.path.exists(src):
+                shutil.copy(src, scratch)
+        os.makedirs(os.path.join(scratch, "data"))
+        shutil.copy(os.path.join(ROOT, "data", "usamovies.json"), os.path.join(scratch, "data"))
+        start = time.monotonic()
+        proc = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.join(ROOT, "record.py"), "--replay", url, "usa.py", cwd=scratch,
+        )
+        returncode = await proc.wait()
+        wall = time.monotonic() - start
+    return {"wall_time_s": round(wall, 3), "returncode": returncode}
+
+
+async def run(args):
+    runner, url = await start_server(args)
+    try:
+        result = await (bench_usa(url) if args.usa else bench_pipeline(args, url))
+        server = dict(runner.app["stats"])
+    finally:
+        await runner.cleanup()
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN if args.usa else resource.RUSAGE_SELF)
+    result["peak_rss_mb"] = round(usage.ru_maxrss / 1024, 1)
+    result["server"] = server
+    if args.usa:
+        result["requests"] = server.get("requests", 0)
+        result["requests_per_sec"] = round(result["requests"] / result["wall_time_s"], 1)
+    return result
+
+
+def compare(result, baseline):
+    lines = []
+    for key, value in result.items():
+        old = baseline.get(key)
+        if not isinstance(value, (int, float)) or not isinstance(old, (int, float)) or not old:
+            continue
+        change = 100 * (value - old) / old
+        better = change > 0 if key in HIGHER_IS_BETTER else change < 0
+        lines.append(f"{key:>18}: {old:>10} -> {value:>10} ({change:+.1f}%{' better' if better and change else ''})")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_server_args(parser)
+    parser.add_argument("--usa", action="store_true", help="benchmark usa.py through record.py --replay")
+    parser.add_argument("--out", help="write the result as JSON")
+    parser.add_argument("--baseline", help="compare against a previous --out result")
+    args = parser.parse_args()
+    if not args.main and not args.usa:
+        args.main = [DEFAULT_MAIN]
+
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2))
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            print(compare(result, json.load(f)))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
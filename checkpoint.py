@@ -0,0 +1,154 @@
+"""Resumable run state for pipeline.py.
+
+Completed zip lookups, theater listings and seat-map records are streamed to
+an append-only JSON-lines checkpoint as they arrive and flushed every few
+seconds, so a run that dies or hits its time box loses at most the last
+unflushed batch.  The fsync after each flush runs in a worker thread, so the
+event loop never waits on the disk.  A torn last line is ignored on load.  A restarted run
+with the same targets picks the checkpoint up and skips everything already
+in it, keeping each seat map's original fetch time for the refresh
+schedule; a checkpoint older than ``CHECKPOINT_MAX_AGE_HOURS`` is considered too
+stale to resume and is discarded.  The checkpoint is deleted once a run
+finishes.
+"""
+
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from common import DATA_DIR
+
+log = logging.getLogger(__name__)
+
+CHECKPOINT_PATH = os.path.join(DATA_DIR, "checkpoint.jsonl")
+MAX_AGE_HOURS = float(os.getenv("CHECKPOINT_MAX_AGE_HOURS", 3))
+FLUSH_EVERY = 50
+FLUSH_SECONDS = 5.0
+
+
+class Checkpoint:
+    def __init__(self, path=CHECKPOINT_PATH, targets=(), max_age_hours=MAX_AGE_HOURS):
+        self.path = path
+        self.targets = sorted([str(m), d] for m, d in targets)
+        self.zips = {}  # zip -> theaters
+        self.listings = {}  # (theater key, date) -> showtimes
+        self.records = {}  # (movie_id, date) -> {showtime_id: record}
+        self.fetched = {}  # (movie_id, date) -> {showtime_id: epoch seconds}
+        self._buffer = []
+        self._last_flush = time.monotonic()
+        self._file = None
+        self._syncer = None  # one worker thread for the fsyncs of appends
+        self._syncing = None
+        self.resumed = self._load(max_age_hours * 3600)
+        if not self.resumed:
+            self._write({"type": "run", "started": time.time(), "targets": self.targets}, reset=True)
+
+    def _load(self, max_age):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                lines = f.readlines()
+        except FileNotFoundError:
+            return False
+        entries = []
+        for line in lines:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                break  # torn write at the end of a killed run
+        header = entries[0] if entries else {}
+        if header.get("type") != "run" or header.get("targets") != self.targets:
+            log.info("discarding checkpoint for other targets")
+            return False
+        if time.time() - header["started"] > max_age:
+            log.info("discarding checkpoint from %.1f hours ago", (time.time() - header["started"]) / 3600)
+            return False
+        for entry in entries[1:]:
+            kind = entry["type"]
+            if kind == "zip":
+                self.zips[entry["zip"]] = entry["theaters"]
+            elif kind == "listing":
+                self.listings[(entry["theater"], entry["date"])] = entry["showtimes"]
+            elif kind == "record":
+                target = (entry["movie_id"], entry["date"])
+                sid = entry["record"]["showtime_id"]
+                self.records.setdefault(target, {})[sid] = entry["record"]
+                self.fetched.setdefault(target, {})[sid] = entry.get("fetched", header["started"])
+        # Rewrite only the entries that parsed so later appends never follow a torn line.
+        self._write(entries, reset=True)
+        log.info("resuming checkpoint: %d zips, %d listings, %d seat maps",
+                 len(self.zips), len(self.listings), sum(map(len, self.records.values())))
+        return True
+
+    def _write(self, entries, reset=False):
+        if isinstance(entries, dict):
+            entries = [entries]
+        if reset:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(e, ensure_ascii=False) + "\n" for e in entries)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            return
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.writelines(json.dumps(e, ensure_ascii=False) + "\n" for e in entries)
+        self._file.flush()
+        # While an fsync is still running, the next flush's (or close's) covers these lines.
+        if self._syncing is None or self._syncing.done():
+            if self._syncer is None:
+                self._syncer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint-fsync")
+            self._syncing = self._syncer.submit(os.fsync, self._file.fileno())
+
+    def _add(self, entry):
+        self._buffer.append(entry)
+        if len(self._buffer) >= FLUSH_EVERY or time.monotonic() - self._last_flush >= FLUSH_SECONDS:
+            self.flush()
+
+    def add_zip(self, zip_code, theaters):
+        self.zips[zip_code] = theaters
+        self._add({"type": "zip", "zip": zip_code, "theaters": theaters})
+
+    def add_listing(self, theater, date, showtimes):
+        self.listings[(theater, date)] = showtimes
+        self._add({"type": "listing", "theater": theater, "date": date, "showtimes": showtimes})
+
+    def add_record(self, target, record, fetched=None):
+        movie_id, date = target
+        fetched = time.time() if fetched is None else fetched
+        self.records.setdefault((movie_id, date), {})[record["showtime_id"]] = record
+        self.fetched.setdefault((movie_id, date), {})[record["showtime_id"]] = fetched
+        self._add({"type": "record", "movie_id": movie_id, "date": date, "fetched": fetched, "record": record})
+
+    def record_for(self, target, showtime_id):
+        return self.records.get(tuple(target), {}).get(showtime_id)
+
+    def fetched_at(self, target, showtime_id):
+        """When a checkpointed seat map was fetched, as epoch seconds."""
+        return self.fetched.get(tuple(target), {}).get(showtime_id)
+
+    def flush(self):
+        if self._buffer:
+            self._write(self._buffer)
+            self._buffer = []
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        self.flush()
+        if self._syncer is not None:
+            self._syncer.shutdown()
+            self._syncer = self._syncing = None
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def discard(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
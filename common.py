@@ -0,0 +1,59 @@
+"""Shared paths and JSON helpers for the USA box-office tracker."""
+
+import json
+import os
+import tempfile
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DATA_DIR = os.path.join(ROOT, "data")
+MOVIES_FILE = os.path.join(DATA_DIR, "usamovies.json")
+ZIPCODES_FILE = os.path.join(ROOT, "zipcodes.txt")
+
+# logs.json / errors.json stamp runs in IST, grouped.json in US Pacific.
+LOG_TZ = ZoneInfo("Asia/Kolkata")
+US_TZ = ZoneInfo("America/Los_Angeles")
+TIME_FORMAT = "%Y-%m-%d %I:%M:%S %p"
+
+# Read once: os.umask can only be queried by setting it.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def movie_dir(movie_id, target_date, root=DATA_DIR):
+    """Return ``data/<movie_id>/<YYYYMMDD>`` for a movie and ``YYYY-MM-DD`` date."""
+    return os.path.join(root, str(movie_id), target_date.replace("-", ""))
+
+
+def stamp(tz=LOG_TZ, now=None):
+    now = now or datetime.now(tz)
+    return now.astimezone(tz).strftime(TIME_FORMAT)
+
+
+def load_json(path, default=None):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return default
+
+
+def write_json(path, data):
+    """Write ``data`` to ``path`` atomically so a killed run never leaves half a file."""
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=folder, prefix=".tmp-", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+        os.chmod(tmp, 0o666 & ~_UMASK)  # mkstemp creates 0600 files
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def read_zipcodes(path=ZIPCODES_FILE):
+    with open(path, encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
@@ -0,0 +1,188 @@
+"""Pipeline source for Fandango listings and the seat-map proxy usa.py reads.
+
+The endpoints and fields are the ones usa.py uses, as seen by running it
+through record.py:
+
+``GET https://www.fandango.com/napi/theaterswithshowtimes``
+    ``zipCode``, ``date``, ``page=1`` and ``limit=40``: the theaters near a
+    zip with every movie's showtimes on that date, under
+    ``theaters[].movies[].variants[].amenityGroups[].showtimes[]``.  A
+    variant's ``formatName`` is the format and the first amenity naming one
+    of ``LANGUAGES`` the language.
+``GET https://usaapi.vercel.app/api/seatmap?showtime_id=N``
+    ``data.totalSeatCount``, ``data.totalAvailableSeatCount`` and the
+    ``ticketInfo`` of the first seating area, priced at its adult ticket.
+
+A theater's listing comes from the Fandango query for its own zip, shared by
+every theater in that zip.  Fandango sits behind a bot check, so, as in
+usa.py, those requests go through cloudscraper (in worker threads) when it is
+installed; seat maps go through the pipeline's throttled session.
+
+    python pipeline.py run --incremental                    # USA_SOURCE defaults to fandango:SOURCE
+"""
+
+import asyncio
+import logging
+import os
+import re
+import threading
+from datetime import datetime
+
+from common import US_TZ
+from metrics import METRICS
+from pipeline import FetchError
+from theater_index import theater_key
+
+try:
+    import cloudscraper
+except ImportError:  # plain aiohttp through the pipeline's session instead
+    cloudscraper = None
+
+log = logging.getLogger(__name__)
+
+FANDANGO_URL = os.getenv("FANDANGO_URL", "https://www.fandango.com")
+SEATMAP_URL = os.getenv("SEATMAP_URL", "https://usaapi.vercel.app/api/seatmap")
+# Concurrent cloudscraper requests (one worker thread each).
+FANDANGO_CONCURRENCY = int(os.getenv("FANDANGO_CONCURRENCY", 16))
+PAGE_LIMIT = 40
+LANGUAGES = ("Hindi", "Telugu", "Tamil", "Malayalam", "Kannada", "Punjabi", "Marathi", "Bengali", "Gujarati",
+             "Spanish", "English")
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+                  "Chrome/124.0.0.0 Safari/537.36",
+    "Accept": "application/json, text/plain, */*",
+    "Accept-Language": "en-US,en;q=0.9",
+    "Origin": "https://www.fandango.com",
+}
+
+_LANGUAGE = re.compile(r"\b(" + "|".join(LANGUAGES) + r")\b", re.I)
+
+
+def language(amenities):
+    for amenity in amenities or []:
+        match = _LANGUAGE.search(amenity.get("name") or "")
+        if match:
+            return match.group(1).title()
+    return "Unknown"
+
+
+def to_theater(theater):
+    """Index theater from a Fandango ``theaters[]`` entry."""
+    return {
+        "theater_id": theater.get("id"),
+        "theater_name": theater["name"],
+        "chainName": theater.get("chainName"),
+        "chainCode": theater.get("chainCode"),
+        "state": theater.get("state"),
+        "city": theater.get("city"),
+        "zip": theater.get("zip"),
+    }
+
+
+def to_listing(theater):
+    """Pipeline listing entries from a Fandango ``theaters[]`` entry, all movies."""
+    showtimes = []
+    for movie in theater.get("movies") or []:
+        for variant in movie.get("variants") or []:
+            for group in variant.get("amenityGroups") or []:
+                group_language = language(group.get("amenities"))
+                for showtime in group.get("showtimes") or []:
+                    showtimes.append({
+                        "movie_id": str(movie.get("id")),
+                        "showtime_id": showtime.get("id"),
+                        "date": showtime["ticketingDate"],
+                        "format": variant.get("formatName", "Standard"),
+                        "language": group_language,
+                    })
+    return showtimes
+
+
+def to_seats(payload):
+    """Seat counts and adult price from a seat-map response; raises :class:`FetchError` like usa.py's errors."""
+    data = payload.get("data") or {}
+    areas = data.get("areas") or []
+    if not areas:
+        raise FetchError(500, "No areas")
+    capacity = data.get("totalSeatCount") or 0
+    if not capacity:
+        raise FetchError(500, "No seats")
+    tickets = areas[0].get("ticketInfo") or []
+    if not tickets:
+        raise FetchError(500, "No ticket info")
+    adult = next((t for t in tickets if "adult" in (t.get("desc") or "").lower()), tickets[0])
+    price = adult.get("price") or 0.0
+    if not price:
+        raise FetchError(500, "Ticket price 0")
+    return {
+        "totalSeatCount": capacity,
+        "totalAvailableSeatCount": data.get("totalAvailableSeatCount") or 0,
+        "adultTicketPrice": price,
+        "fee": adult.get("fee") or 0.0,
+    }
+
+
+class FandangoSource:
+    def __init__(self, fandango_url=FANDANGO_URL, seatmap_url=SEATMAP_URL, concurrency=FANDANGO_CONCURRENCY):
+        self.fandango_url = fandango_url.rstrip("/")
+        self.seatmap_url = seatmap_url
+        self.concurrency = concurrency
+        self._sem = None
+        self._local = threading.local()
+        self._near = {}  # (zip, date) -> task with the Fandango theaters near it
+
+    def _scraper(self):
+        scraper = getattr(self._local, "scraper", None)
+        if scraper is None:
+            scraper = self._local.scraper = cloudscraper.create_scraper()
+        return scraper
+
+    def _get_sync(self, url, params, headers):
+        resp = self._scraper().get(url, params=params, headers=headers, timeout=30)
+        if resp.status_code != 200:
+            raise FetchError(resp.status_code, resp.reason)
+        return resp.json()
+
+    async def theaters_near(self, session, zip_code, date):
+        """Fandango's ``theaters[]`` for a zip and date (one request, page 1, as usa.py does)."""
+        url = f"{self.fandango_url}/napi/theaterswithshowtimes"
+        params = {"zipCode": zip_code, "date": date, "page": 1, "limit": PAGE_LIMIT,
+                  "filter": "open-theaters", "filterEnabled": "true"}
+        headers = {**HEADERS, "Referer": f"{self.fandango_url}/{zip_code}_movietimes?date={date}"}
+        METRICS.count("fandango_requests")
+        if cloudscraper is None:
+            async with session.get(url, params=params, headers=headers) as resp:
+                if resp.status != 200:
+                    raise FetchError(resp.status, resp.reason)
+                payload = await resp.json(content_type=None)
+        else:
+            if self._sem is None:
+                self._sem = asyncio.Semaphore(self.concurrency)
+            async with self._sem:
+                payload = await asyncio.to_thread(self._get_sync, url, params, headers)
+        return payload.get("theaters") or []
+
+    async def lookup_theaters(self, session, zip_code):
+        # Fandango only lists theaters with showtimes on a date; today's stands in for "open".
+        today = datetime.now(US_TZ).strftime("%Y-%m-%d")
+        return [to_theater(t) for t in await self.theaters_near(session, zip_code, today)]
+
+    async def showtimes(self, session, theater, date):
+        key = (theater.get("zip"), date)
+        if key not in self._near:
+            self._near[key] = asyncio.ensure_future(self.theaters_near(session, *key))
+        near = await asyncio.shield(self._near[key])
+        for candidate in near:
+            found = to_theater(candidate)
+            same_id = theater.get("theater_id") is not None and found["theater_id"] == theater["theater_id"]
+            if same_id or theater_key(found) == theater_key(theater):
+                return to_listing(candidate)
+        raise FetchError(404, f"{theater['theater_name']} not listed near {theater.get('zip')}")
+
+    async def seat_map(self, session, theater, showtime):
+        async with session.get(self.seatmap_url, params={"showtime_id": showtime["showtime_id"]}) as resp:
+            if resp.status != 200:
+                raise FetchError(resp.status, resp.reason)
+            return to_seats(await resp.json(content_type=None))
+
+
+SOURCE = FandangoSource
@@ -0,0 +1,178 @@
+"""Per-showtime refresh scheduling for incremental runs.
+
+The previous run's records (from the snapshot store, else ``main.json``) are
+the state: every showtime keeps its last record and, in ``refresh.json``,
+when it was last fetched and how fast ``totalSeatSold`` has been moving.  Each run only re-fetches showtimes that
+are due:
+
+* new showtimes and previous errors are always due;
+* sold-out shows and shows that have already started are final and never
+  fetched again;
+* otherwise a show is refreshed about every ``SEATS_PER_REFRESH`` seats at its
+  current sales rate, at least ``4`` times in the hours left before it starts,
+  and never more often than ``MIN_INTERVAL_HOURS`` or less often than
+  ``MAX_INTERVAL_HOURS``.
+
+At most ``REFRESH_BUDGET`` seat maps are fetched per run, split evenly between
+the shards of a sharded run; when more shows are due, the most overdue
+(relative to their own interval) go first, which keeps the request count per
+run flat as the show count grows.
+
+A theater whose listing could not be fetched this run (an error or the time
+box) keeps its previous records rather than dropping out of the totals.
+"""
+
+import math
+import os
+import time
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from common import load_json, write_json
+from store import Store
+from theater_index import theater_key
+
+MIN_INTERVAL_HOURS = float(os.getenv("MIN_REFRESH_HOURS", 1))
+MAX_INTERVAL_HOURS = float(os.getenv("MAX_REFRESH_HOURS", 12))
+SEATS_PER_REFRESH = float(os.getenv("SEATS_PER_REFRESH", 5))
+# Seat maps per run across all targets; 0 for no limit.
+REFRESH_BUDGET = int(os.getenv("REFRESH_BUDGET", 1000)) or None
+VELOCITY_SMOOTHING = 0.5
+
+_EASTERN = ZoneInfo("America/New_York")
+_CENTRAL = ZoneInfo("America/Chicago")
+_MOUNTAIN = ZoneInfo("America/Denver")
+_PACIFIC = ZoneInfo("America/Los_Angeles")
+_STATE_TZ = {
+    **dict.fromkeys(
+        ("AL", "AR", "IA", "IL", "KS", "LA", "MN", "MO", "MS", "ND", "NE", "OK", "SD", "TN", "TX", "WI"),
+        _CENTRAL,
+    ),
+    **dict.fromkeys(("CO", "ID", "MT", "NM", "UT", "WY"), _MOUNTAIN),
+    "AZ": ZoneInfo("America/Phoenix"),
+    **dict.fromkeys(("CA", "NV", "OR", "WA"), _PACIFIC),
+    "AK": ZoneInfo("America/Anchorage"),
+    "HI": ZoneInfo("Pacific/Honolulu"),
+}
+# Cities on the other side of a line that splits their state.
+_CITY_TZ = {
+    **{("TN", c): _EASTERN for c in (
+        "Knoxville", "Chattanooga", "Johnson City", "Kingsport", "Bristol", "Maryville", "Oak Ridge",
+        "Cleveland", "Morristown", "Sevierville", "Pigeon Forge", "Farragut", "Athens", "Greeneville",
+    )},
+    **{("KY", c): _CENTRAL for c in (
+        "Bowling Green", "Paducah", "Owensboro", "Hopkinsville", "Henderson", "Madisonville", "Murray",
+        "Glasgow",
+    )},
+    **{("FL", c): _CENTRAL for c in (
+        "Pensacola", "Panama City", "Panama City Beach", "Fort Walton Beach", "Destin", "Crestview",
+        "Niceville", "Navarre", "Milton", "Gulf Breeze", "Pace", "Marianna",
+    )},
+    **{("IN", c): _CENTRAL for c in (
+        "Evansville", "Gary", "Hammond", "Merrillville", "Valparaiso", "Michigan City", "Schererville",
+        "Portage", "Crown Point", "Munster", "Hobart", "Highland",
+    )},
+    **{("MI", c): _CENTRAL for c in ("Iron Mountain", "Menominee")},
+    **{("TX", c): _MOUNTAIN for c in ("El Paso", "Horizon City")},
+    **{("SD", c): _MOUNTAIN for c in ("Rapid City", "Spearfish", "Sturgis")},
+    **{("NE", c): _MOUNTAIN for c in ("Scottsbluff", "Alliance", "Sidney")},
+    **{("ND", c): _MOUNTAIN for c in ("Dickinson",)},
+    **{("KS", c): _MOUNTAIN for c in ("Goodland",)},
+    **{("OR", c): _MOUNTAIN for c in ("Ontario",)},
+    **{("ID", c): _PACIFIC for c in ("Coeur d'Alene", "Post Falls", "Lewiston", "Moscow", "Sandpoint")},
+}
+
+
+def show_start(record):
+    """Start time of a showtime record as an epoch timestamp, in the theater's local time zone."""
+    local = datetime.strptime(record["date"], "%Y-%m-%d+%H:%M")
+    state = record.get("state")
+    tz = _CITY_TZ.get((state, record.get("city"))) or _STATE_TZ.get(state, _EASTERN)
+    return local.replace(tzinfo=tz).timestamp()
+
+
+class RefreshState:
+    """Previous records and refresh history for one movie and date."""
+
+    def __init__(self, folder, now=None):
+        self.folder = folder
+        self.now = time.time() if now is None else now
+        records = Store(folder).records_at() or load_json(os.path.join(folder, "main.json"), [])
+        self.previous = {r["showtime_id"]: r for r in records if r.get("showtime_id") is not None}
+        self.history = {int(k): v for k, v in load_json(os.path.join(folder, "refresh.json"), {}).items()}
+
+    def is_final(self, record):
+        return record.get("totalAvailableSeatCount") == 0 or show_start(record) <= self.now
+
+    def interval(self, showtime_id, record):
+        hist = self.history.get(showtime_id, {})
+        hours = MAX_INTERVAL_HOURS
+        velocity = hist.get("velocity", 0.0)
+        if velocity > 0:
+            hours = min(hours, SEATS_PER_REFRESH / velocity)
+        hours = min(hours, (show_start(record) - self.now) / 3600 / 4)
+        return max(MIN_INTERVAL_HOURS, hours)
+
+    def priority(self, showtime_id):
+        """How overdue a showtime is relative to its interval; ``inf`` if never fetched, ``None`` if final."""
+        record = self.previous.get(showtime_id)
+        hist = self.history.get(showtime_id)
+        if record is None or "error" in record or hist is None:
+            return math.inf
+        if self.is_final(record):
+            return None
+        return (self.now - hist["fetched"]) / 3600 / self.interval(showtime_id, record)
+
+    def carried(self, listed_ids, listed_theaters):
+        """Previous records to keep without fetching.
+
+        That is shows that are listed but not due, shows that are final
+        (started shows drop out of the upstream listing) and every show at a
+        theater outside ``listed_theaters``, whose listing this run didn't get.
+        """
+        return [
+            r for sid, r in self.previous.items()
+            if "error" not in r
+            and (sid in listed_ids or self.is_final(r) or theater_key(r) not in listed_theaters)
+        ]
+
+    def record_fetched(self, records, fetched_at=None):
+        """Update the history from this run's records.
+
+        ``fetched_at`` maps showtime ids to when their record was really
+        fetched (seat maps resumed from a checkpoint); the rest count as ``now``.
+        """
+        fetched_at = fetched_at or {}
+        for r in records:
+            sid = r.get("showtime_id")
+            if sid is None or "error" in r:
+                continue
+            when = fetched_at.get(sid) or self.now
+            hist = self.history.get(sid)
+            if hist is not None and when <= hist["fetched"]:
+                continue  # already recorded, e.g. by the partial run that checkpointed it
+            velocity = 0.0
+            if hist is not None:
+                rate = max(0, r["totalSeatSold"] - hist["sold"]) / ((when - hist["fetched"]) / 3600)
+                velocity = VELOCITY_SMOOTHING * rate + (1 - VELOCITY_SMOOTHING) * hist.get("velocity", 0.0)
+            self.history[sid] = {"fetched": when, "sold": r["totalSeatSold"], "velocity": round(velocity, 3)}
+
+    def save(self, folder=None):
+        write_json(os.path.join(folder or self.folder, "refresh.json"), {str(k): v for k, v in self.history.items()})
+
+
+def select_due(candidates, states, budget=REFRESH_BUDGET):
+    """Pick which ``(target, showtime_id)`` candidates to fetch this run.
+
+    Candidates with priority ``>= 1`` are due; with a budget, only the
+    ``budget`` most overdue are kept, and never-fetched shows come first.
+    """
+    due = []
+    for target, sid in candidates:
+        priority = states[target].priority(sid)
+        if priority is not None and priority >= 1:
+            due.append((priority, target, sid))
+    due.sort(key=lambda item: item[0], reverse=True)
+    if budget:
+        due = due[:budget]
+    return {(target, sid) for _, target, sid in due}
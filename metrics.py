@@ -0,0 +1,226 @@
+"""Per-run instrumentation written to ``metrics.json``.
+
+Collects wall time per stage (zip discovery, theater dedupe, showtime
+listing, seat maps, aggregation, JSON writes), per-host request counts,
+status codes, latency histograms and bytes downloaded through an aiohttp
+``TraceConfig``, plus retry and cloudscraper-fallback counters.  With
+``USA_PROFILE=cpu`` (or ``mem``, or ``cpu,mem``) the run is also profiled
+with cProfile / tracemalloc and the top entries are stored with it.
+
+Code under measurement uses the module-level :data:`METRICS`::
+
+    with METRICS.stage("seatmaps"):
+        await ...
+
+usa.py can be measured from the outside, like record.py does:
+
+    MOVIE_ID=244687 TARGET_DATE=2026-03-18 python metrics.py usa.py
+"""
+
+import argparse
+import cProfile
+import io
+import os
+import pstats
+import resource
+import runpy
+import sys
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import aiohttp
+
+from common import DATA_DIR, load_json, movie_dir, stamp, write_json
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+BUCKETS_MS = (25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+KEEP_RUNS = 48
+PROFILE = {p.strip() for p in os.getenv("USA_PROFILE", "").lower().split(",") if p.strip()}
+PROFILE_TOP = 25
+
+
+class HostStats:
+    def __init__(self):
+        self.requests = 0
+        self.bytes = 0
+        self.statuses = Counter()
+        self.histogram = [0] * (len(BUCKETS_MS) + 1)
+        self.total_ms = 0.0
+
+    def add(self, status, elapsed_ms):
+        self.requests += 1
+        self.statuses[str(status)] += 1
+        self.total_ms += elapsed_ms
+        for i, bound in enumerate(BUCKETS_MS):
+            if elapsed_ms <= bound:
+                self.histogram[i] += 1
+                break
+        else:
+            self.histogram[-1] += 1
+
+    def as_dict(self):
+        labels = [f"<={b}ms" for b in BUCKETS_MS] + [f">{BUCKETS_MS[-1]}ms"]
+        return {
+            "requests": self.requests,
+            "bytes": self.bytes,
+            "avg_ms": round(self.total_ms / self.requests, 1) if self.requests else None,
+            "statuses": dict(self.statuses),
+            "latency_histogram": dict(zip(labels, self.histogram)),
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.started = time.monotonic()
+        self.stages = defaultdict(float)
+        self.counters = Counter()
+        self.hosts = defaultdict(HostStats)
+        self.extra = {}
+        self._profiler = None
+
+    @contextmanager
+    def stage(self, name):
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.stages[name] += time.monotonic() - start
+
+    def count(self, name, n=1):
+        self.counters[name] += n
+
+    def trace_config(self):
+        """An aiohttp ``TraceConfig`` feeding per-host request stats into this object."""
+        trace = aiohttp.TraceConfig()
+
+        async def on_start(session, ctx, params):
+            ctx.start = time.monotonic()
+            ctx.host = params.url.host or ""
+
+        async def on_end(session, ctx, params):
+            self.hosts[ctx.host].add(params.response.status, 1000 * (time.monotonic() - ctx.start))
+
+        async def on_exception(session, ctx, params):
+            self.hosts[ctx.host].add(type(params.exception).__name__, 1000 * (time.monotonic() - ctx.start))
+
+        async def on_chunk(session, ctx, params):
+            self.hosts[ctx.host].bytes += len(params.chunk)
+
+        trace.on_request_start.append(on_start)
+        trace.on_request_end.append(on_end)
+        trace.on_request_exception.append(on_exception)
+        trace.on_response_chunk_received.append(on_chunk)
+        return trace
+
+    def start_profiling(self):
+        if "cpu" in PROFILE:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        if "mem" in PROFILE:
+            tracemalloc.start()
+
+    def stop_profiling(self):
+        profile = {}
+        if self._profiler:
+            self._profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(PROFILE_TOP)
+            profile["cpu"] = out.getvalue().splitlines()
+            self._profiler = None
+        if tracemalloc.is_tracing():
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            profile["mem_peak_mb"] = round(peak / 2 ** 20, 1)
+            profile["mem_top"] = [str(stat) for stat in snapshot.statistics("lineno")[:PROFILE_TOP]]
+        return profile
+
+    def snapshot(self):
+        hosts = {host: stats.as_dict() for host, stats in sorted(self.hosts.items())}
+        return {
+            "time": stamp(),
+            "wall_time_s": round(time.monotonic() - self.started, 3),
+            "stages_s": {name: round(seconds, 3) for name, seconds in self.stages.items()},
+            "requests": sum(h["requests"] for h in hosts.values()),
+            "bytes_downloaded": sum(h["bytes"] for h in hosts.values()),
+            "counters": dict(self.counters),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "hosts": hosts,
+            **self.extra,
+        }
+
+    def write(self, folder=DATA_DIR):
+        """Append this run to ``<folder>/metrics.json``, keeping the last ``KEEP_RUNS`` runs."""
+        entry = self.snapshot()
+        profile = self.stop_profiling()
+        if profile:
+            entry["profile"] = profile
+        path = os.path.join(folder, "metrics.json")
+        runs = load_json(path, [])[-(KEEP_RUNS - 1):]
+        runs.append(entry)
+        write_json(path, runs)
+        return entry
+
+
+METRICS = Metrics()
+
+
+def install(metrics=METRICS):
+    """Instrument every aiohttp session and requests/cloudscraper call in this process."""
+    original_init = aiohttp.ClientSession.__init__
+
+    def __init__(self, *args, trace_configs=None, **kwargs):
+        original_init(self, *args, trace_configs=[*(trace_configs or []), metrics.trace_config()], **kwargs)
+
+    aiohttp.ClientSession.__init__ = __init__
+
+    if requests is not None:
+        original_request = requests.Session.request
+
+        def request(self, method, url, **kwargs):
+            metrics.count("cloudscraper_fallback" if type(self).__name__ == "CloudScraper" else "sync_requests")
+            stats = metrics.hosts[urlsplit(str(url)).hostname or ""]
+            start = time.monotonic()
+            try:
+                resp = original_request(self, method, url, **kwargs)
+            except Exception as exc:
+                stats.add(type(exc).__name__, 1000 * (time.monotonic() - start))
+                raise
+            stats.add(resp.status_code, 1000 * (time.monotonic() - start))
+            if not kwargs.get("stream"):
+                stats.bytes += len(resp.content)
+            return resp
+
+        requests.Session.request = request
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("script", help="script to run, e.g. usa.py")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    install()
+    METRICS.start_profiling()
+    sys.argv = [args.script, *args.args]
+    sys.path[0] = os.path.dirname(os.path.abspath(args.script))
+    try:
+        with METRICS.stage("script"):
+            runpy.run_path(args.script, run_name="__main__")
+    finally:
+        target = (os.getenv("MOVIE_ID"), os.getenv("TARGET_DATE"))
+        METRICS.write(movie_dir(*target) if all(target) else DATA_DIR)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""Local stand-in for Fandango and the chain APIs.
+
+Two kinds of traffic are served, both with configurable latency, jitter and
+injected 429 / ``500 No areas`` failures:
+
+* recorded fixtures (``record.py --out``), matched on method, original host
+  and path+query, so a whole usa.py run can be replayed offline through
+  ``record.py --replay``;
+* a small synthetic API under ``/mock/`` built from the latest records of
+  existing targets (their snapshot store, or a ``main.json``) and scaled to
+  N copies of every theater, used by :class:`MockSource` to drive
+  ``pipeline.py`` at sizes we haven't seen live yet, and the same
+  catalog in the shape of the Fandango and seat-map endpoints, so that
+  fandango.py runs against it with ``FANDANGO_URL`` / ``SEATMAP_URL`` set.
+
+    python mockserver.py --fixtures fixtures/live --latency 80 --jitter 40
+    python mockserver.py --main data/*/*/ --scale 10 --rate-429 0.02 --rate-500 0.01 --fail-match amc
+"""
+
+import argparse
+import asyncio
+import base64
+import glob
+import json
+import os
+import random
+import re
+from collections import Counter, defaultdict
+from itertools import count
+
+from aiohttp import web
+from yarl import URL
+
+from common import load_json
+from pipeline import FetchError
+from record import REPLAY_HOST_HEADER
+from store import Store
+
+MOCK_URL = os.getenv("MOCK_URL", "http://127.0.0.1:8080")
+SCALE_ID_OFFSET = 10 ** 9
+
+
+class Faults:
+    def __init__(self, latency_ms=0, jitter_ms=0, rate_429=0.0, rate_500=0.0, fail_match=None, seed=None):
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.rate_429 = rate_429
+        self.rate_500 = rate_500
+        self.fail_match = re.compile(fail_match, re.I) if fail_match else None
+        self.random = random.Random(seed)
+
+    async def apply(self, target):
+        """Sleep for the simulated latency and return an injected error response, if any."""
+        delay = self.latency + self.random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.fail_match and not self.fail_match.search(target):
+            return None
+        roll = self.random.random()
+        if roll < self.rate_429:
+            return web.Response(status=429, headers={"Retry-After": "1"}, text="Too Many Requests")
+        if roll < self.rate_429 + self.rate_500:
+            return web.Response(status=500, reason="No areas", text="No areas")
+        return None
+
+
+class Fixtures:
+    def __init__(self, folder):
+        self.responses = defaultdict(list)
+        self.cursor = Counter()
+        with open(os.path.join(folder, "responses.jsonl"), encoding="utf-8") as f:
+            for line in f:
+                entry = json.loads(line)
+                url = URL(entry["url"])
+                self.responses[(entry["method"], url.host, url.path_qs)].append(entry)
+                self.responses[(entry["method"], None, url.path_qs)].append(entry)
+
+    def match(self, request):
+        host = request.headers.get(REPLAY_HOST_HEADER)
+        for key in ((request.method, host, request.path_qs), (request.method, None, request.path_qs)):
+            entries = self.responses.get(key)
+            if entries:
+                entry = entries[self.cursor[key] % len(entries)]
+                self.cursor[key] += 1
+                return entry
+        return None
+
+
+def to_response(entry):
+    body = base64.b64decode(entry["base64"]) if "base64" in entry else entry["text"].encode("utf-8")
+    headers = {"Retry-After": entry["retry_after"]} if entry.get("retry_after") else None
+    content_type = (entry.get("content_type") or "application/octet-stream").split(";")[0]
+    return web.Response(status=entry["status"], body=body, content_type=content_type, headers=headers)
+
+
+def target_folder(path):
+    """The ``data/<movie_id>/<YYYYMMDD>`` folder of a ``--main`` path."""
+    path = os.path.abspath(path)
+    return path if os.path.isdir(path) else os.path.dirname(path)
+
+
+def target_records(path):
+    """A target's last records: from a folder's store and ``errors.json``, or from a ``main.json`` file."""
+    if not os.path.isdir(path):
+        return load_json(path, [])
+    errors = load_json(os.path.join(path, "errors.json"), {}).get("errors", [])
+    return Store(path).records_at() + errors
+
+
+def expand(patterns):
+    """The paths matching ``--main`` globs; exits if patterns were given but nothing matched."""
+    paths = sorted(p for pattern in patterns for p in glob.glob(pattern))
+    if patterns and not paths:
+        raise SystemExit(f"--main: nothing matches {' '.join(patterns)}")
+    return paths
+
+
+class Catalog:
+    """Theaters, listings and seat maps rebuilt from ``main.json``-style records, ``scale`` times over."""
+
+    def __init__(self, main_paths, scale=1):
+        self.zips = defaultdict(list)
+        self.listings = defaultdict(list)
+        self.seats = {}
+        synthetic_ids = count(1)
+        for path in main_paths:
+            folder = target_folder(path)
+            movie_id = os.path.basename(os.path.dirname(folder))
+            for r in target_records(path):
+                for k in range(scale):
+                    self._add(movie_id, r, k, synthetic_ids)
+
+    def _add(self, movie_id, r, k, synthetic_ids):
+        zip_code = r["zip"] if k == 0 else f"{r['zip']}-{k}"
+        theater_id = f"{r['chainCode']}:{r['theater_name']}#{k}"
+        theater = {
+            "theater_id": theater_id,
+            "theater_name": r["theater_name"] if k == 0 else f"{r['theater_name']} #{k}",
+            **{f: r[f] for f in ("chainName", "chainCode", "state", "city")},
+            "zip": zip_code,
+        }
+        if theater not in self.zips[zip_code]:
+            self.zips[zip_code].append(theater)
+        showtime_id = r["showtime_id"] if r["showtime_id"] is not None else -next(synthetic_ids)
+        showtime_id += k * SCALE_ID_OFFSET
+        date = r["date"].split("+")[0]
+        self.listings[(theater_id, date)].append({
+            "movie_id": movie_id,
+            "showtime_id": showtime_id,
+            **{f: r[f] for f in ("date", "format", "language")},
+        })
+        # Showtimes that failed live keep failing here, like AMC's "No areas".
+        self.seats[showtime_id] = None if "error" in r else {
+            f: r[f] for f in ("totalSeatCount", "totalAvailableSeatCount", "adultTicketPrice", "fee")
+        }
+
+
+def fandango_theater(theater, listing):
+    """A Fandango ``theaters[]`` entry for a catalog theater and its listing."""
+    movies = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
+    for s in listing:
+        movies[s["movie_id"]][s["format"]][s["language"]].append({"id": s["showtime_id"], "ticketingDate": s["date"]})
+    return {
+        "id": theater["theater_id"],
+        "name": theater["theater_name"],
+        **{f: theater[f] for f in ("chainName", "chainCode", "state", "city", "zip")},
+        "movies": [{"id": int(movie_id), "variants": [
+            {"formatName": fmt, "amenityGroups": [
+                {"amenities": [{"name": "Reserved Seating"}, {"name": lang}], "showtimes": showtimes}
+                for lang, showtimes in groups.items()
+            ]} for fmt, groups in variants.items()
+        ]} for movie_id, variants in movies.items()],
+    }
+
+
+def make_app(faults=None, fixtures=None, catalog=None):
+    faults = faults or Faults()
+    stats = Counter()
+    app = web.Application()
+
+    async def respond(request, handler):
+        target = request.headers.get(REPLAY_HOST_HEADER, "") + request.path_qs
+        resp = await faults.apply(target) or handler(request)
+        stats["requests"] += 1
+        stats[f"status_{resp.status}"] += 1
+        return resp
+
+    def theaters(request):
+        return web.json_response(catalog.zips.get(request.query["zip"], []))
+
+    def showtimes(request):
+        return web.json_response(catalog.listings.get((request.query["theater"], request.query["date"]), []))
+
+    def seatmap(request):
+        seats = catalog.seats.get(int(request.query["showtime"]), {})
+        if seats is None:
+            return web.Response(status=500, reason="No areas", text="No areas")
+        return web.json_response(seats) if seats else web.Response(status=404)
+
+    def fandango_theaters(request):
+        date = request.query["date"]
+        return web.json_response({"theaters": [
+            fandango_theater(t, catalog.listings.get((t["theater_id"], date), []))
+            for t in catalog.zips.get(request.query["zipCode"], [])[:int(request.query.get("limit", 40))]
+        ]})
+
+    def fandango_seatmap(request):
+        seats = catalog.seats.get(int(request.query["showtime_id"]), {})
+        if not seats:  # "No areas" or unknown
+            return web.json_response({"data": {"areas": []}})
+        return web.json_response({"data": {
+            "totalSeatCount": seats["totalSeatCount"],
+            "totalAvailableSeatCount": seats["totalAvailableSeatCount"],
+            "areas": [{"ticketInfo": [{"desc": "Adult", "price": seats["adultTicketPrice"], "fee": seats["fee"]}]}],
+        }})
+
+    def replay(request):
+        entry = fixtures.match(request) if fixtures else None
+        return to_response(entry) if entry else web.Response(status=404, text="no fixture")
+
+    async def get_stats(request):
+        return web.json_response(dict(stats))
+
+    async def get_zips(request):
+        return web.json_response(list(catalog.zips))
+
+    def route(handler):
+        async def routed(request):
+            return await respond(request, handler)
+        return routed
+
+    app.router.add_get("/mock/stats", get_stats)
+    if catalog:
+        app.router.add_get("/mock/zips", get_zips)
+        app.router.add_get("/mock/theaters", route(theaters))
+        app.router.add_get("/mock/showtimes", route(showtimes))
+        app.router.add_get("/mock/seatmap", route(seatmap))
+        app.router.add_get("/napi/theaterswithshowtimes", route(fandango_theaters))
+        app.router.add_get("/api/seatmap", route(fandango_seatmap))
+    app.router.add_route("*", "/{tail:.*}", route(replay))
+    app["stats"] = stats
+    return app
+
+
+class MockSource:
+    """Pipeline source for the synthetic ``/mock/`` API (``USA_SOURCE=mockserver:MockSource``)."""
+
+    def __init__(self, base_url=MOCK_URL):
+        self.base_url = base_url.rstrip("/")
+
+    async def _get(self, session, path, **params):
+        async with session.get(f"{self.base_url}/mock/{path}", params=params) as resp:
+            if resp.status != 200:
+                raise FetchError(resp.status, resp.reason)
+            return await resp.json()
+
+    async def lookup_theaters(self, session, zip_code):
+        return await self._get(session, "theaters", zip=zip_code)
+
+    async def showtimes(self, session, theater, date):
+        return await self._get(session, "showtimes", theater=theater["theater_id"], date=date)
+
+    async def seat_map(self, session, theater, showtime):
+        return await self._get(session, "seatmap", showtime=showtime["showtime_id"])
+
+
+def add_server_args(parser):
+    parser.add_argument("--fixtures", help="folder with a recorded responses.jsonl")
+    parser.add_argument("--main", nargs="*", default=[],
+                        help="target folders (read from their store) or main.json files for the synthetic API")
+    parser.add_argument("--scale", type=int, default=1, help="copies of every theater in the synthetic API")
+    parser.add_argument("--latency", type=float, default=0, help="base latency in ms")
+    parser.add_argument("--jitter", type=float, default=0, help="extra random latency in ms")
+    parser.add_argument("--rate-429", type=float, default=0.0)
+    parser.add_argument("--rate-500", type=float, default=0.0)
+    parser.add_argument("--fail-match", help="only inject failures on URLs matching this regex")
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def app_from_args(args):
+    faults = Faults(args.latency, args.jitter, args.rate_429, args.rate_500, args.fail_match, args.seed)
+    fixtures = Fixtures(args.fixtures) if args.fixtures else None
+    paths = expand(args.main)
+    catalog = Catalog(paths, args.scale) if paths else None
+    return make_app(faults, fixtures, catalog)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    add_server_args(parser)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    args = parser.parse_args()
+    web.run_app(app_from_args(args), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,348 @@
+"""Single-run sweep over every tracked (movie, date) target.
+
+Each theater's showtime listing is fetched once per date and the seat-map
+requests for every tracked movie found in it are fanned out on one shared,
+per-host throttled session (``ratelimit.ThrottledSession``), so another film
+only costs its own seat maps instead of a second national sweep.
+
+The upstream calls come from a *source* object, loaded from ``--source`` or
+``USA_SOURCE`` as ``module:attribute`` (``fandango:SOURCE`` by default, see
+fandango.py), with three coroutines:
+
+``lookup_theaters(session, zip_code)``
+    theaters around a zip, as dicts with ``theater_name``, ``chainName``,
+    ``chainCode``, ``state``, ``city``, ``zip`` and ideally ``theater_id``.
+``showtimes(session, theater, date)``
+    every showtime the theater lists for ``YYYY-MM-DD`` for all movies, as
+    dicts with ``movie_id``, ``showtime_id``, ``date`` (``YYYY-MM-DD+HH:MM``,
+    which for a late show can be past midnight), ``format`` and ``language``.
+``seat_map(session, theater, showtime)``
+    ``totalSeatCount``, ``totalAvailableSeatCount``, ``adultTicketPrice`` and
+    ``fee``; raises :class:`FetchError` when the chain refuses the request.
+
+    python pipeline.py targets [--json]
+    python pipeline.py run [--source mysource:SOURCE] [--incremental] [--time-box 50]
+"""
+
+import argparse
+import asyncio
+import importlib
+import json
+import logging
+import os
+import time
+from collections import namedtuple
+
+from checkpoint import CHECKPOINT_PATH, Checkpoint
+from common import DATA_DIR, MOVIES_FILE, ZIPCODES_FILE, load_json, movie_dir, read_zipcodes, write_json
+from incremental import REFRESH_BUDGET, RefreshState, select_due
+from metrics import METRICS
+from ratelimit import ThrottledSession
+from store import Store, publish
+from theater_index import INDEX_PATH, TheaterIndex, refresh, theater_key
+
+log = logging.getLogger(__name__)
+
+LISTING_CONCURRENCY = int(os.getenv("LISTING_CONCURRENCY", 64))
+SEATMAP_CONCURRENCY = int(os.getenv("SEATMAP_CONCURRENCY", 128))
+# Cap on re-checks of expired zips per run; the rest wait for later runs.
+# Zips never looked up before are always looked up (see theater_index.py).
+REFRESH_LIMIT = int(os.getenv("THEATER_REFRESH_LIMIT", 300))
+DEFAULT_SOURCE = "fandango:SOURCE"
+
+Target = namedtuple("Target", "movie_id date")
+
+
+class FetchError(Exception):
+    def __init__(self, status, reason):
+        super().__init__(f"{status} {reason}")
+        self.status = status
+        self.reason = reason
+
+
+def load_targets(path=MOVIES_FILE):
+    """Targets from ``TARGETS`` (``id:date,...``), ``MOVIE_ID``/``TARGET_DATE`` or ``usamovies.json``.
+
+    A movie entry may list several ``dates``; otherwise its ``release_date`` is tracked.
+    """
+    if os.getenv("TARGETS"):
+        pairs = (item.split(":", 1) for item in os.environ["TARGETS"].split(",") if item.strip())
+        return [Target(m.strip(), d.strip()) for m, d in pairs]
+    if os.getenv("MOVIE_ID") and os.getenv("TARGET_DATE"):
+        return [Target(os.environ["MOVIE_ID"], os.environ["TARGET_DATE"])]
+    targets = []
+    for movie in load_json(path, []):
+        for date in movie.get("dates") or [movie["release_date"]]:
+            targets.append(Target(str(movie["id"]), date))
+    return targets
+
+
+def load_source(spec):
+    module, _, attr = spec.partition(":")
+    source = getattr(importlib.import_module(module), attr or "SOURCE")
+    return source() if isinstance(source, type) else source
+
+
+def _base_record(theater, showtime):
+    return {
+        "state": theater.get("state"),
+        "city": theater.get("city"),
+        "zip": theater.get("zip"),
+        "theater_name": theater["theater_name"],
+        "chainName": theater.get("chainName"),
+        "chainCode": theater.get("chainCode"),
+        "showtime_id": showtime.get("showtime_id"),
+        "date": showtime["date"],
+        "format": showtime.get("format") or "Standard",
+        "language": showtime.get("language") or "Unknown",
+    }
+
+
+def build_record(theater, showtime, seats):
+    """A ``main.json`` record from a theater, its listing entry and the seat map."""
+    record = _base_record(theater, showtime)
+    capacity = seats["totalSeatCount"]
+    available = seats["totalAvailableSeatCount"]
+    sold = capacity - available
+    price = seats["adultTicketPrice"]
+    fee = seats["fee"]
+    gross = round(sold * price, 2)
+    record.update({
+        "totalSeatSold": sold,
+        "occupancy": round(100 * sold / capacity, 2) if capacity else 0.0,
+        "totalAvailableSeatCount": available,
+        "totalSeatCount": capacity,
+        "grossRevenueUSD": gross,
+        "adultTicketPrice": price,
+        "fee": fee,
+        "totalRevenueWithFee": round(gross + sold * fee, 2),
+    })
+    return record
+
+
+def error_record(theater, showtime, exc):
+    record = _base_record(theater, showtime)
+    record["error"] = {"status": getattr(exc, "status", None), "reason": getattr(exc, "reason", str(exc))}
+    return record
+
+
+async def sweep(session, source, theaters, targets, states=None, checkpoint=None, deadline=None,
+                budget=REFRESH_BUDGET):
+    """Fetch seat maps for every target.
+
+    Returns ``({target: [records]}, complete)`` with records in completion
+    order.  With ``states`` (``{target: RefreshState}``) only due showtimes
+    are fetched, at most ``budget`` of them, and the rest, as well as the
+    shows of theaters whose listing failed, keep their previous record.  Listings and seat
+    maps already in ``checkpoint`` are reused instead of fetched (and keep
+    their original fetch time in the refresh state), and once
+    the ``time.monotonic()`` ``deadline`` passes no new request is started
+    and ``complete`` is false.
+    """
+    results = {Target(str(t.movie_id), t.date): [] for t in targets}
+    dates = sorted({t.date for t in results})
+    listing_sem = asyncio.Semaphore(LISTING_CONCURRENCY)
+    seat_sem = asyncio.Semaphore(SEATMAP_CONCURRENCY)
+    listed = []  # (theater, showtime, target)
+    seen = set()  # (target, showtime_id) already in listed
+    listed_theaters = {date: set() for date in dates}  # theater keys with a listing this run
+    resumed = {target: {} for target in results}  # showtime_id -> original fetch time
+    skipped = 0
+
+    def out_of_time():
+        nonlocal skipped
+        if deadline is not None and time.monotonic() >= deadline:
+            skipped += 1
+            return True
+        return False
+
+    async def theater_day(theater, date):
+        key = theater_key(theater)
+        listing = checkpoint.listings.get((key, date)) if checkpoint else None
+        if listing is None:
+            async with listing_sem:
+                if out_of_time():
+                    return
+                try:
+                    listing = await source.showtimes(session, theater, date)
+                except Exception as exc:
+                    log.warning("showtimes failed for %s on %s: %s", theater["theater_name"], date, exc)
+                    return
+            if checkpoint:
+                checkpoint.add_listing(key, date, listing)
+        listed_theaters[date].add(key)
+        for showtime in listing:
+            target = Target(str(showtime["movie_id"]), date)
+            if target in results:
+                sid = showtime.get("showtime_id")
+                if sid is not None:
+                    # The same show can come back under two index entries; count it once.
+                    if (target, sid) in seen:
+                        continue
+                    seen.add((target, sid))
+                listed.append((theater, showtime, target))
+
+    async def seat(theater, showtime, target):
+        sid = showtime.get("showtime_id")
+        done = checkpoint.record_for(target, sid) if checkpoint else None
+        if done:
+            results[target].append(done)
+            resumed[target][sid] = checkpoint.fetched_at(target, sid)
+            return
+        async with seat_sem:
+            if out_of_time():
+                return
+            try:
+                seats = await source.seat_map(session, theater, showtime)
+            except Exception as exc:
+                results[target].append(error_record(theater, showtime, exc))
+                return
+        record = build_record(theater, showtime, seats)
+        results[target].append(record)
+        if checkpoint and record["showtime_id"] is not None:
+            checkpoint.add_record(target, record)
+
+    with METRICS.stage("showtimes"):
+        await asyncio.gather(*(theater_day(t, d) for t in theaters for d in dates))
+    fetch = listed
+    if states is not None:
+        due = select_due([(target, showtime.get("showtime_id")) for _, showtime, target in listed], states, budget)
+        fetch = [item for item in listed if (item[2], item[1].get("showtime_id")) in due]
+        log.info("%d/%d listed showtimes due for a seat-map refresh", len(fetch), len(listed))
+    with METRICS.stage("seatmaps"):
+        await asyncio.gather(*(seat(*item) for item in fetch))
+    METRICS.count("showtimes_listed", len(listed))
+    METRICS.count("seatmaps_fetched", len(fetch))
+    if skipped:
+        METRICS.count("skipped_at_deadline", skipped)
+        log.warning("time box reached, %d requests left for the next run", skipped)
+
+    for target, state in (states or {}).items():
+        state.record_fetched(results[target], resumed[target])
+        fetched = {r["showtime_id"] for r in results[target]}
+        listed_ids = {showtime.get("showtime_id") for _, showtime, t in listed if t == target}
+        carried = state.carried(listed_ids, listed_theaters[target.date])
+        results[target].extend(r for r in carried if r["showtime_id"] not in fetched)
+    return results, not skipped
+
+
+def keep_previous(folder, records):
+    """Fill a partial run's records with the previous run's records it didn't reach."""
+    fetched = {r["showtime_id"] for r in records}
+    return records + [r for r in Store(folder).records_at() if r["showtime_id"] not in fetched]
+
+
+async def run(source, targets, index_path=INDEX_PATH, incremental=False, resume=True, deadline=None, shard=None):
+    """Run one sweep and write every target's outputs; returns whether it finished.
+
+    An unfinished (time-boxed) run still writes its fresh records, on top of
+    the previous ones, and leaves its checkpoint for the next run to resume;
+    it is stored as a partial run, so it adds no ``logs.json`` entry.
+
+    With a ``shard`` (see shard.py) only the zips it owns are looked up, and
+    the theaters it owns are swept along with any theater its own lookups
+    found that the shared index didn't know yet, which no other shard could
+    sweep.  The index, checkpoint, refresh state and a raw ``main.json`` per
+    target go under ``shard.dir`` for ``shard.py merge`` to combine, and the
+    shard gets its share of ``REFRESH_BUDGET``.
+    """
+    targets = [Target(str(t.movie_id), t.date) for t in targets]
+    out_dir = shard.dir if shard else DATA_DIR
+    index = TheaterIndex.load(index_path)
+    known = {theater_key(t) for t in index.all_theaters()}
+    zips = read_zipcodes() if os.path.exists(ZIPCODES_FILE) else list(index.zips)
+    if shard:
+        index.path = os.path.join(out_dir, "theaters.json")
+        zips = [z for z in zips if shard.owns_zip(z)]
+    states = {t: RefreshState(movie_dir(*t)) for t in targets} if incremental else None
+    budget = -(-REFRESH_BUDGET // shard.count) if shard and REFRESH_BUDGET else REFRESH_BUDGET
+    checkpoint = Checkpoint(os.path.join(out_dir, "checkpoint.jsonl"), targets) if resume else None
+    lookup = source.lookup_theaters
+    if checkpoint:
+        for zip_code, theaters in checkpoint.zips.items():
+            index.update(zip_code, theaters)
+
+        async def lookup(session, zip_code):
+            theaters = await source.lookup_theaters(session, zip_code)
+            checkpoint.add_zip(zip_code, theaters)
+            return theaters
+
+    try:
+        async with ThrottledSession(trace_configs=[METRICS.trace_config()]) as session:
+            with METRICS.stage("zip_discovery"):
+                await refresh(index, zips, lookup, session, limit=REFRESH_LIMIT)
+            with METRICS.stage("theater_dedupe"):
+                index.save()
+                theaters = index.all_theaters()
+                if shard:
+                    theaters = [t for t in theaters if shard.owns_theater(t) or theater_key(t) not in known]
+                    swept = {theater_key(t) for t in theaters}
+            log.info("sweeping %d theaters for %d targets", len(theaters), len(targets))
+            results, complete = await sweep(session, source, theaters, targets, states, checkpoint, deadline, budget)
+            log.info("host limits: %s, %d retries", session.stats(), session.retried)
+            METRICS.count("retries", session.retried)
+            METRICS.extra["host_limits"] = session.stats()
+    finally:
+        if checkpoint:
+            checkpoint.flush()
+    for target, records in results.items():
+        folder = movie_dir(*target)
+        if not complete and states is None:
+            records = keep_previous(folder, records)
+        METRICS.count("seatmap_errors", sum("error" in r for r in records))
+        if shard:
+            out = movie_dir(*target, root=out_dir)
+            write_json(os.path.join(out, "main.json"), [r for r in records if theater_key(r) in swept])
+            if states:
+                states[target].save(out)
+            continue
+        publish(folder, records, partial=not complete)
+        if states:
+            states[target].save()
+    if checkpoint:
+        if complete:
+            checkpoint.discard()
+        else:
+            checkpoint.close()
+    return complete
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    targets_cmd = sub.add_parser("targets", help="print tracked targets as '<movie_id> <date>' lines")
+    targets_cmd.add_argument("--json", action="store_true", help="print a JSON list for a CI job matrix")
+    run_cmd = sub.add_parser("run", help="sweep all targets in one process")
+    run_cmd.add_argument("--source", default=os.getenv("USA_SOURCE") or DEFAULT_SOURCE)
+    run_cmd.add_argument("--index", default=INDEX_PATH)
+    run_cmd.add_argument("--incremental", action="store_true", default=bool(os.getenv("INCREMENTAL")),
+                         help="only re-fetch due showtimes, keeping the rest from the previous main.json")
+    run_cmd.add_argument("--fresh", action="store_true", help="ignore and replace an existing checkpoint")
+    run_cmd.add_argument("--time-box", type=float, default=float(os.getenv("RUN_TIME_BOX_MINUTES", 0)) or None,
+                         help="stop starting requests after this many minutes and checkpoint the rest")
+    args = parser.parse_args()
+
+    targets = load_targets()
+    if args.cmd == "targets":
+        if args.json:
+            print(json.dumps([
+                {"movie_id": t.movie_id, "date": t.date, "folder": os.path.relpath(movie_dir(*t), DATA_DIR)}
+                for t in targets
+            ]))
+            return
+        for target in targets:
+            print(target.movie_id, target.date)
+        return
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.fresh and os.path.exists(CHECKPOINT_PATH):
+        os.remove(CHECKPOINT_PATH)
+    deadline = time.monotonic() + 60 * args.time_box if args.time_box else None
+    METRICS.start_profiling()
+    try:
+        asyncio.run(run(load_source(args.source), targets, args.index, args.incremental, deadline=deadline))
+    finally:
+        METRICS.write()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""Adaptive per-host concurrency for upstream requests.
+
+Each upstream host (Fandango, AMC, Regal, ...) gets its own AIMD limiter: the
+in-flight limit grows by about one request per round-trip while responses
+come back fast and clean, and is halved on 429/503, timeouts, a
+``Retry-After`` or when the recent rate of 502/503/504s and timeouts climbs.
+A plain 500 doesn't count at all: AMC answers some showtimes with a steady
+``500 No areas`` that neither slowing down nor retrying fixes, and since it
+comes for all of a chain's seat maps at once it isn't a sign of load either,
+so plain 500s aren't retried or counted towards the error rate.
+Retries go back through the same limiter with jittered backoff, so a
+throttled host is slowed down instead of hammered by a retry storm, and
+every host gets its own keep-alive connection pool.
+
+``ThrottledSession`` is a drop-in for the parts of ``aiohttp.ClientSession``
+the sources use::
+
+    async with ThrottledSession() as session:
+        async with session.get(url) as resp:
+            data = await resp.json()
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+import aiohttp
+
+log = logging.getLogger(__name__)
+
+HostSettings = namedtuple("HostSettings", "initial maximum keepalive")
+
+DEFAULT_SETTINGS = HostSettings(initial=8, maximum=64, keepalive=30)
+HOST_SETTINGS = {
+    "fandango.com": HostSettings(initial=16, maximum=96, keepalive=60),
+    "amctheatres.com": HostSettings(initial=4, maximum=24, keepalive=30),
+    "regmovies.com": HostSettings(initial=8, maximum=48, keepalive=30),
+    "cinemark.com": HostSettings(initial=8, maximum=48, keepalive=30),
+}
+RETRY_STATUSES = {429, 502, 503, 504}
+THROTTLE_STATUSES = {429, 503}
+# Gateway errors and timeouts; back off once their smoothed share of responses passes this.
+ERROR_STATUSES = {502, 503, 504}
+ERROR_RATE_LIMIT = 0.2
+ERROR_SMOOTHING = 0.05
+RETRIES = 2
+BACKOFF = 0.5
+# Responses slower than this multiple of the fastest recent latency count as
+# congestion: the limit stops growing until latency recovers.
+SLOW_FACTOR = 3.0
+TIMEOUT = aiohttp.ClientTimeout(total=30, sock_connect=10)
+
+
+def host_settings(host):
+    for suffix, settings in HOST_SETTINGS.items():
+        if host == suffix or host.endswith("." + suffix):
+            return settings
+    return DEFAULT_SETTINGS
+
+
+class AIMDLimiter:
+    def __init__(self, host, settings=DEFAULT_SETTINGS, minimum=1, decrease=0.5):
+        self.host = host
+        self.limit = float(settings.initial)
+        self.minimum = minimum
+        self.maximum = settings.maximum
+        self.decrease = decrease
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.base_latency = None
+        self.latency = None
+        self.last_decrease = 0.0
+        self.error_rate = 0.0
+        self.counts = {"ok": 0, "throttled": 0, "failed": 0}
+        self._cond = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._cond:
+            while self.in_flight >= int(self.limit):
+                await self._cond.wait()
+            self.in_flight += 1
+        delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def release(self):
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def record(self, status, latency, retry_after=None):
+        """Feed back one response (``status=None`` for a connection error or timeout)."""
+        now = time.monotonic()
+        errored = status is None or status in ERROR_STATUSES
+        self.error_rate += ERROR_SMOOTHING * (errored - self.error_rate)
+        if status is not None and status < 500 and status != 429:
+            self.counts["ok"] += 1
+            self.latency = latency if self.latency is None else 0.8 * self.latency + 0.2 * latency
+            self.base_latency = latency if self.base_latency is None else min(latency, 0.99 * self.base_latency + 0.01 * latency)
+            if self.latency < SLOW_FACTOR * self.base_latency and self.error_rate < ERROR_RATE_LIMIT:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            return
+        self.counts["throttled" if status in THROTTLE_STATUSES else "failed"] += 1
+        if retry_after:
+            self.paused_until = max(self.paused_until, now + retry_after)
+        throttled = status is None or status in THROTTLE_STATUSES or retry_after
+        if not throttled and not (errored and self.error_rate >= ERROR_RATE_LIMIT):
+            return
+        # One decrease per round-trip, so a burst of failures from requests
+        # already in flight doesn't collapse the limit to the floor.
+        if now - self.last_decrease >= (self.latency or 1.0):
+            self.limit = max(self.minimum, self.limit * self.decrease)
+            self.last_decrease = now
+            log.info("%s: backing off to %d in flight after %s", self.host, int(self.limit), status or "error")
+
+    def snapshot(self):
+        return {
+            "limit": int(self.limit),
+            "latency_ms": round(1000 * self.latency, 1) if self.latency is not None else None,
+            **self.counts,
+        }
+
+
+def _retry_after(resp):
+    try:
+        return float(resp.headers.get("Retry-After", ""))
+    except ValueError:
+        return None
+
+
+class _ThrottledRequest:
+    def __init__(self, owner, method, url, kwargs):
+        self.owner = owner
+        self.method = method
+        self.url = url
+        self.kwargs = kwargs
+        self.limiter = None
+        self.resp = None
+
+    async def __aenter__(self):
+        host = urlsplit(str(self.url)).hostname or ""
+        self.limiter = self.owner.limiter(host)
+        session = self.owner.session(host)
+        for attempt in range(self.owner.retries + 1):
+            await self.limiter.acquire()
+            start = time.monotonic()
+            try:
+                resp = await session.request(self.method, self.url, **self.kwargs)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                self.limiter.record(None, time.monotonic() - start)
+                await self.limiter.release()
+                if attempt == self.owner.retries:
+                    raise
+            else:
+                retry_after = _retry_after(resp)
+                self.limiter.record(resp.status, time.monotonic() - start, retry_after)
+                if resp.status not in RETRY_STATUSES or attempt == self.owner.retries:
+                    self.resp = resp
+                    return resp
+                resp.release()
+                await self.limiter.release()
+            self.owner.retried += 1
+            await asyncio.sleep(BACKOFF * 2 ** attempt * (0.5 + random.random()))
+
+    async def __aexit__(self, *exc):
+        self.resp.release()
+        await self.limiter.release()
+
+
+class ThrottledSession:
+    """One keep-alive pool and AIMD limiter per upstream host."""
+
+    def __init__(self, retries=RETRIES, **session_kwargs):
+        self.retries = retries
+        self.retried = 0
+        self.session_kwargs = {"timeout": TIMEOUT, **session_kwargs}
+        self._sessions = {}
+        self._limiters = {}
+
+    def limiter(self, host):
+        if host not in self._limiters:
+            self._limiters[host] = AIMDLimiter(host, host_settings(host))
+        return self._limiters[host]
+
+    def session(self, host):
+        if host not in self._sessions:
+            settings = host_settings(host)
+            connector = aiohttp.TCPConnector(
+                limit=settings.maximum,
+                limit_per_host=settings.maximum,
+                keepalive_timeout=settings.keepalive,
+                ttl_dns_cache=300,
+            )
+            self._sessions[host] = aiohttp.ClientSession(connector=connector, **self.session_kwargs)
+        return self._sessions[host]
+
+    def request(self, method, url, **kwargs):
+        return _ThrottledRequest(self, method, url, kwargs)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def stats(self):
+        return {host: limiter.snapshot() for host, limiter in self._limiters.items()}
+
+    async def close(self):
+        for session in self._sessions.values():
+            await session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
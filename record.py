@@ -0,0 +1,143 @@
+"""Record or redirect the HTTP traffic of a scraper run.
+
+usa.py can't be edited, so this hooks the HTTP clients it uses
+(``aiohttp.ClientSession`` and, for the cloudscraper fallback,
+``requests.Session``) and then runs the script unchanged:
+
+    # capture every response of a live run into fixtures/live/responses.jsonl
+    MOVIE_ID=244687 TARGET_DATE=2026-03-18 python record.py --out fixtures/live usa.py
+
+    # send the same run to a local mockserver.py replaying those fixtures
+    python record.py --replay http://127.0.0.1:8080 usa.py
+"""
+
+import argparse
+import base64
+import json
+import os
+import re
+import runpy
+import sys
+import threading
+import time
+
+import aiohttp
+from yarl import URL
+
+try:
+    import requests
+except ImportError:  # only needed when the scraper falls back to cloudscraper
+    requests = None
+
+REPLAY_HOST_HEADER = "X-Replay-Host"
+KINDS = (
+    ("seatmap", re.compile(r"seat", re.I)),
+    ("showtimes", re.compile(r"showtime|performance|session", re.I)),
+    ("theaters", re.compile(r"theat|cinema|venue|location", re.I)),
+)
+
+
+def classify(url):
+    for kind, pattern in KINDS:
+        if pattern.search(url):
+            return kind
+    return "other"
+
+
+def encode_body(body):
+    try:
+        return {"text": body.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"base64": base64.b64encode(body).decode("ascii")}
+
+
+class Recorder:
+    def __init__(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        self.path = os.path.join(folder, "responses.jsonl")
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+        self.count = 0
+
+    def add(self, method, url, status, headers, body, elapsed):
+        entry = {
+            "kind": classify(str(url)),
+            "method": method.upper(),
+            "url": str(url),
+            "status": status,
+            "content_type": headers.get("Content-Type", ""),
+            "retry_after": headers.get("Retry-After"),
+            "elapsed_ms": round(1000 * elapsed, 1),
+            **encode_body(body),
+        }
+        with self._lock:
+            self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._file.flush()
+            self.count += 1
+
+    def close(self):
+        self._file.close()
+
+
+def _redirected(url, replay, headers):
+    url = URL(str(url))
+    headers = dict(headers or {})
+    headers[REPLAY_HOST_HEADER] = url.host or ""
+    return URL(replay).with_path(url.path).with_query(url.query), headers
+
+
+def install(recorder=None, replay=None):
+    """Patch the HTTP clients; returns nothing, the patches last for the process."""
+    original = aiohttp.ClientSession._request
+
+    async def _request(self, method, url, **kwargs):
+        if replay:
+            url, kwargs["headers"] = _redirected(url, replay, kwargs.get("headers"))
+            kwargs.pop("ssl", None)
+        start = time.monotonic()
+        resp = await original(self, method, url, **kwargs)
+        if recorder:
+            body = await resp.read()  # cached on the response, the caller can still read it
+            recorder.add(method, url, resp.status, resp.headers, body, time.monotonic() - start)
+        return resp
+
+    aiohttp.ClientSession._request = _request
+
+    if requests is not None:
+        original_sync = requests.Session.request
+
+        def request(self, method, url, **kwargs):
+            if replay:
+                url, kwargs["headers"] = _redirected(url, replay, kwargs.get("headers"))
+                url = str(url)
+            start = time.monotonic()
+            resp = original_sync(self, method, url, **kwargs)
+            if recorder:
+                recorder.add(method, url, resp.status_code, resp.headers, resp.content, time.monotonic() - start)
+            return resp
+
+        requests.Session.request = request
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", help="fixture folder to record responses into")
+    parser.add_argument("--replay", help="base URL of a mockserver.py to send every request to")
+    parser.add_argument("script", help="script to run, e.g. usa.py")
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    recorder = Recorder(args.out) if args.out else None
+    install(recorder, args.replay)
+    sys.argv = [args.script, *args.args]
+    sys.path[0] = os.path.dirname(os.path.abspath(args.script))  # as if run directly
+    try:
+        runpy.run_path(args.script, run_name="__main__")
+    finally:
+        if recorder:
+            recorder.close()
+            print(f"recorded {recorder.count} responses to {recorder.path}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
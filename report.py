@@ -0,0 +1,115 @@
+"""Build and write the per-movie output files from showtime records.
+
+``main.json`` holds one record per showtime, ``grouped.json`` folds the
+formats of a theater's showing into one entry, ``errors.json`` lists the
+showtimes whose seat map could not be read, ``breakdowns.json`` has totals per
+theater, chain, state, city, format and language, and ``logs.json`` has one
+summary entry per run.  All totals come from one set of
+:class:`aggregate.Columns` per run; store.py feeds these from the snapshot
+store.
+"""
+
+import os
+
+from aggregate import SHOW_KEY, Columns, breakdowns
+from common import US_TZ, stamp, write_json
+from metrics import METRICS
+
+SHOW_FIELDS = ("state", "city", "zip", "theater_name", "chainName", "chainCode", "date", "language")
+
+
+def group_shows(cols):
+    """Group records by (theater, start time, language) in first-seen order."""
+    codes, labels = cols.factorize(SHOW_KEY)
+    _, _, (sold, capacity, gross, gross_fee) = cols.group_sums(SHOW_KEY)
+    shows = [None] * len(labels)
+    for code, r in zip(codes, cols.records):
+        show = shows[code]
+        if show is None:
+            show = shows[code] = {f: r[f] for f in SHOW_FIELDS}
+            show["formats"] = []
+        show["formats"].append({
+            "showtime_id": r["showtime_id"],
+            "format": r["format"].lower(),
+            "totalSeatSold": r["totalSeatSold"],
+            "totalSeatCount": r["totalSeatCount"],
+            "grossRevenueUSD": r["grossRevenueUSD"],
+            "grossRevenueWithFee": r["totalRevenueWithFee"],
+            "adultTicketPrice": r["adultTicketPrice"],
+            "fee": r["fee"],
+            "occupancy": r["occupancy"],
+        })
+    for i, show in enumerate(shows):
+        show["finalGrossRevenueUSD"] = round(gross[i], 2)
+        show["finalGrossRevenueWithFee"] = round(gross_fee[i], 2)
+        show["finalTotalSold"] = sold[i]
+        show["finalTotalCapacity"] = capacity[i]
+    return shows
+
+
+def grouped_report(cols, now=None):
+    shows = group_shows(cols)
+    return {
+        "last_updated": stamp(US_TZ, now),
+        "total_gross_usd": round(sum(s["finalGrossRevenueUSD"] for s in shows), 2),
+        "total_gross_with_fee": round(sum(s["finalGrossRevenueWithFee"] for s in shows), 2),
+        "total_shows": len(shows),
+        "total_sold": cols.total("sold"),
+        "total_capacity": cols.total("capacity"),
+        "shows": shows,
+    }
+
+
+def log_entry(cols, now=None):
+    sold = cols.total("sold")
+    capacity = cols.total("capacity")
+    return {
+        "time": stamp(now=now),
+        "total_gross_usd": round(cols.total("gross"), 2),
+        "total_gross_with_fee": round(cols.total("gross_with_fee"), 2),
+        "total_shows": cols.n,
+        "avg_occupancy": round(100 * sold / capacity, 2) if capacity else 0.0,
+        "tickets_sold": sold,
+        "unique_venues": len(cols.factorize(("theater_name",))[1]),
+    }
+
+
+def zeroed(error):
+    """A failed showtime as usa.py lists it in ``grouped.json``: no seats, no gross."""
+    record = {k: v for k, v in error.items() if k != "error"}
+    record.update({
+        "totalSeatSold": 0, "occupancy": 0.0, "totalAvailableSeatCount": 0, "totalSeatCount": 0,
+        "grossRevenueUSD": 0.0, "adultTicketPrice": 0, "fee": 0, "totalRevenueWithFee": 0.0,
+    })
+    return record
+
+
+def split_errors(results):
+    records = [r for r in results if "error" not in r]
+    errors = [r for r in results if "error" in r]
+    return records, errors
+
+
+def write_reports(folder, results, logs, now=None):
+    """Write main/grouped/breakdowns and the ``logs`` history for one movie and date.
+
+    ``results`` is the showtime records, with failed seat maps carrying an
+    ``error`` key instead of seat counts; ``grouped.json`` lists the ones
+    with a ``showtime_id`` with zero seats, and the totals leave them out.
+    """
+    with METRICS.stage("aggregation"):
+        records, errors = split_errors(results)
+        cols = Columns(records)
+        listed = [zeroed(e) for e in errors if e.get("showtime_id") is not None]
+        grouped = grouped_report(Columns(records + listed) if listed else cols, now)
+        totals = breakdowns(cols)
+    with METRICS.stage("json_writes"):
+        write_json(os.path.join(folder, "main.json"), results)
+        write_json(os.path.join(folder, "grouped.json"), grouped)
+        write_json(os.path.join(folder, "breakdowns.json"), totals)
+        write_json(os.path.join(folder, "logs.json"), logs)
+
+
+def write_errors(folder, results):
+    _, errors = split_errors(results)
+    write_json(os.path.join(folder, "errors.json"), {"last_updated": stamp(), "errors": errors})
@@ -0,0 +1,234 @@
+"""Sharded sweeps across processes or CI jobs, and the merge that combines them.
+
+Theaters are partitioned deterministically by a CRC32 of their
+``theater_key`` (or of the state with ``--by state``) and zips by a CRC32 of
+the zip, so every shard owns a fixed slice of the work.  Each shard runs
+pipeline.py on its slice and writes a raw ``main.json`` per target, its zip index, refresh state
+and metrics under ``shards/<i>-of-<N>/``.  ``merge`` combines all N shards
+into the usual ``main.json``, ``grouped.json``, ``errors.json`` and one
+``logs.json`` entry per target, keeping one record per ``showtime_id``.
+
+A theater that isn't in the shared ``data/theaters.json`` yet (a cold index,
+or one that just opened) is swept by whichever shards' zips found it, since
+its owner can't know about it; ``dedupe`` drops the overlap.  From the next
+run on it is in the merged index and only its owner sweeps it.
+
+A shard that hits its time box leaves its ``checkpoint.jsonl`` in its
+directory and the merged run is stored as partial.  ``local`` resumes from
+that checkpoint on the next run; CI shard jobs start on fresh runners, so
+they don't, and simply sweep again from the merged data.
+
+    python shard.py run --shard 0/4         # one CI matrix job
+    python shard.py merge --count 4         # the job after them
+    python shard.py local 4                 # process pool + merge
+"""
+
+import argparse
+import asyncio
+import glob
+import logging
+import os
+import time
+import zlib
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from common import DATA_DIR, ROOT, load_json, stamp, write_json
+from metrics import KEEP_RUNS, METRICS
+from pipeline import DEFAULT_SOURCE, load_source, load_targets, run
+from store import publish
+from theater_index import INDEX_PATH, TheaterIndex, theater_key
+
+log = logging.getLogger(__name__)
+
+SHARDS_DIR = os.path.join(ROOT, "shards")
+
+
+def _bucket(key, count):
+    return zlib.crc32(key.encode("utf-8")) % count
+
+
+class Shard(namedtuple("Shard", "index count by")):
+    @property
+    def dir(self):
+        return os.path.join(SHARDS_DIR, f"{self.index}-of-{self.count}")
+
+    def owns_zip(self, zip_code):
+        return _bucket(zip_code, self.count) == self.index
+
+    def owns_theater(self, theater):
+        """Works on index theaters and showtime records alike, which share these fields."""
+        if self.by == "state":
+            key = theater.get("state") or ""
+        else:
+            key = theater_key(theater)
+        return _bucket(key, self.count) == self.index
+
+
+def parse_shard(spec, by="hash"):
+    """``"i/N"`` (0-based) -> :class:`Shard`."""
+    index, _, count = spec.partition("/")
+    try:
+        shard = Shard(int(index), int(count), by)
+    except ValueError:
+        shard = None
+    if shard is None or not 0 <= shard.index < shard.count:
+        raise ValueError(f"shard {spec!r} must be i/N with 0 <= i < N")
+    return shard
+
+
+def run_shard(shard, source_spec, incremental=False, time_box=None):
+    """Sweep one shard in this process; returns whether it finished."""
+    # force: main() has configured the root logger already, also in local's forked workers.
+    logging.basicConfig(level=logging.INFO, format=f"%(asctime)s [shard {shard.index}] %(levelname)s %(message)s",
+                        force=True)
+    METRICS.reset()
+    METRICS.start_profiling()
+    deadline = time.monotonic() + 60 * time_box if time_box else None
+    try:
+        with METRICS.stage("shard"):
+            return asyncio.run(run(load_source(source_spec), load_targets(), incremental=incremental,
+                                   deadline=deadline, shard=shard))
+    finally:
+        METRICS.write(shard.dir)
+
+
+def dedupe(record_lists):
+    """One record per showtime, first seen wins unless a later shard has seats where it had an error."""
+    merged = {}
+    for records in record_lists:
+        for r in records:
+            sid = r.get("showtime_id")
+            key = sid if sid is not None else (r["theater_name"], r["date"], r["format"])
+            current = merged.get(key)
+            if current is None or ("error" in current and "error" not in r):
+                merged[key] = r
+    return list(merged.values())
+
+
+def merge_history(histories):
+    """One ``refresh.json`` from the shards': per showtime, the most recent fetch wins."""
+    merged = {}
+    for history in histories:
+        for sid, entry in history.items():
+            if entry["fetched"] >= merged.get(sid, {}).get("fetched", 0):
+                merged[sid] = entry
+    return merged
+
+
+def shard_dirs(count):
+    dirs = [os.path.join(SHARDS_DIR, f"{i}-of-{count}") for i in range(count)]
+    missing = [d for d in dirs if not os.path.isdir(d)]
+    if missing:
+        raise SystemExit(f"missing shard output: {', '.join(missing)}")
+    return dirs
+
+
+def _targets_in(dirs):
+    found = set()
+    for folder in dirs:
+        for path in glob.glob(os.path.join(folder, "*", "*", "main.json")):
+            day = os.path.dirname(path)
+            found.add((os.path.basename(os.path.dirname(day)), os.path.basename(day)))
+    return sorted(found)
+
+
+def _merge_index(dirs):
+    index = TheaterIndex.load(INDEX_PATH)
+    for folder in dirs:
+        part = TheaterIndex.load(os.path.join(folder, "theaters.json"))
+        for zip_code, entry in part.zips.items():
+            if entry["checked"] > index.zips.get(zip_code, {}).get("checked", 0):
+                index.zips[zip_code] = entry
+        for key, theater in part.theaters.items():
+            index.theaters.setdefault(key, theater)
+    index.save()
+
+
+def _merge_metrics(dirs):
+    """One ``data/metrics.json`` entry for the sharded run: wall time of the slowest shard, summed work."""
+    shards = [(load_json(os.path.join(d, "metrics.json"), []) or [None])[-1] for d in dirs]
+    shards = [{k: v for k, v in m.items() if k != "profile"} for m in shards if m]
+    if not shards:
+        return
+    stages = Counter({"merge": round(METRICS.stages["merge"], 3)})
+    counters = Counter()
+    for m in shards:
+        stages.update(m["stages_s"])
+        counters.update(m["counters"])
+    path = os.path.join(DATA_DIR, "metrics.json")
+    runs = load_json(path, [])[-(KEEP_RUNS - 1):]
+    runs.append({
+        "time": stamp(),
+        "wall_time_s": max(m["wall_time_s"] for m in shards),
+        "stages_s": {name: round(seconds, 3) for name, seconds in stages.items()},
+        "requests": sum(m["requests"] for m in shards),
+        "bytes_downloaded": sum(m["bytes_downloaded"] for m in shards),
+        "counters": dict(counters),
+        "shards": shards,
+    })
+    write_json(path, runs)
+
+
+def merge(count):
+    """Combine ``count`` shard outputs into ``data/`` and clear the merged shard files."""
+    dirs = shard_dirs(count)
+    # A shard only keeps its checkpoint when it stopped at the time box.
+    partial = any(os.path.exists(os.path.join(d, "checkpoint.jsonl")) for d in dirs)
+    with METRICS.stage("merge"):
+        for movie_id, day in _targets_in(dirs):
+            parts = [load_json(os.path.join(d, movie_id, day, "main.json"), []) for d in dirs]
+            records = dedupe(parts)
+            folder = os.path.join(DATA_DIR, movie_id, day)
+            publish(folder, records, partial=partial)
+            history = merge_history([load_json(os.path.join(folder, "refresh.json"), {})] + [
+                load_json(os.path.join(d, movie_id, day, "refresh.json"), {}) for d in dirs
+            ])
+            if history:
+                write_json(os.path.join(folder, "refresh.json"), history)
+            log.info("merged %s/%s: %d records from %d shards", movie_id, day, len(records), count)
+        _merge_index(dirs)
+    _merge_metrics(dirs)
+    # Only the merged *.json go; an unfinished shard's checkpoint.jsonl stays (see above).
+    for d in dirs:
+        for path in glob.glob(os.path.join(d, "*", "*", "*.json")) + glob.glob(os.path.join(d, "*.json")):
+            os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    for name in ("run", "local"):
+        cmd = sub.add_parser(name)
+        if name == "run":
+            cmd.add_argument("--shard", required=True, help="i/N, 0-based")
+        else:
+            cmd.add_argument("count", type=int)
+        cmd.add_argument("--by", choices=("hash", "state"), default=os.getenv("SHARD_BY", "hash"))
+        cmd.add_argument("--source", default=os.getenv("USA_SOURCE") or DEFAULT_SOURCE)
+        cmd.add_argument("--incremental", action="store_true", default=bool(os.getenv("INCREMENTAL")))
+        cmd.add_argument("--time-box", type=float, default=float(os.getenv("RUN_TIME_BOX_MINUTES", 0)) or None)
+    merge_cmd = sub.add_parser("merge")
+    merge_cmd.add_argument("--count", type=int, required=True)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    if args.cmd == "run":
+        try:
+            shard = parse_shard(args.shard, args.by)
+        except ValueError as e:
+            parser.error(str(e))
+        run_shard(shard, args.source, args.incremental, args.time_box)
+    elif args.cmd == "local":
+        shards = [Shard(i, args.count, args.by) for i in range(args.count)]
+        with ProcessPoolExecutor(max_workers=args.count) as pool:
+            futures = [pool.submit(run_shard, s, args.source, args.incremental, args.time_box) for s in shards]
+            done = [f.result() for f in futures]
+        log.info("%d/%d shards finished", sum(done), args.count)
+        merge(args.count)
+    else:
+        merge(args.count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""Append-only snapshot store for seat counts over time.
+
+Each movie/date folder keeps a ``store/`` directory next to its JSON files:
+
+``snapshots.bin``
+    fixed-size little-endian rows ``(run, showtime_id, sold, capacity,
+    available, gross, gross_with_fee, price, fee)``, appended only when a
+    showtime's numbers changed since its previous row, or when it drops out
+    of a run (delisted or failed), as a row with ``sold == GONE``;
+``runs.bin``
+    one int64 epoch timestamp per run;
+``partial.bin``
+    the timestamps of runs that stopped early (time box): their records
+    feed the views but, as an incomplete sweep, they get no ``logs.json``
+    entry of their own;
+``showtimes.jsonl``
+    theater/time/format details per showtime, appended when first seen or
+    when they change;
+``legacy_logs.json``
+    the ``logs.json`` entries from before the store, kept verbatim by ``import``.
+
+Reads go through ``mmap`` so trend queries don't parse any JSON.  The store
+is the only per-target data committed: ``main.json``, ``grouped.json``,
+``breakdowns.json`` and ``logs.json`` are views regenerated from it after
+every run (and by ``views``), and ``errors.json`` (the last run's failed seat
+maps), ``metrics.json`` and ``refresh.json`` are rewritten every run; CI
+publishes the first two with the views and carries the rest in its cache::
+
+    python store.py import data/244687/20260318
+    python store.py views data/*/*/
+    python store.py sold data/244687/20260318 536662564
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import time
+from datetime import datetime
+
+from aggregate import DIMENSIONS, Columns
+from common import LOG_TZ, TIME_FORMAT, load_json, write_json
+from metrics import METRICS
+from report import log_entry, write_errors, write_reports
+
+ROW = struct.Struct("<qqiiiddff")
+RUN = struct.Struct("<q")
+FIELDS = ("run", "showtime_id", "sold", "capacity", "available", "gross", "gross_with_fee", "price", "fee")
+DETAIL_FIELDS = ("state", "city", "zip", "theater_name", "chainName", "chainCode", "date", "format", "language")
+GONE = -1
+
+
+def _read(path, layout, start=0):
+    """Unpack the rows of a fixed-layout file from byte ``start`` on, through a read-only memory map.
+
+    Returns ``None`` if the file is shorter than ``start`` (it was replaced).
+    """
+    try:
+        f = open(path, "rb")
+    except FileNotFoundError:
+        return [] if start == 0 else None
+    with f:
+        size = os.fstat(f.fileno()).st_size
+        if size < start:
+            return None
+        if size - start < layout.size:
+            return []
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            usable = size - (size - start) % layout.size  # ignore a torn trailing row
+            with memoryview(mm)[start:usable] as view:  # no copy, released before the map closes
+                return list(layout.iter_unpack(view))
+
+
+class Store:
+    def __init__(self, folder):
+        self.dir = os.path.join(folder, "store")
+        self.snapshots_path = os.path.join(self.dir, "snapshots.bin")
+        self.runs_path = os.path.join(self.dir, "runs.bin")
+        self.partial_path = os.path.join(self.dir, "partial.bin")
+        self.details_path = os.path.join(self.dir, "showtimes.jsonl")
+        self.legacy_logs_path = os.path.join(self.dir, "legacy_logs.json")
+        self._rows = []  # decoded snapshot rows, extended as the file grows
+        self._last = {}  # showtime id -> last row among self._rows[:self._folded]
+        self._folded = 0
+
+    def rows(self):
+        """Every snapshot row; each is decoded once per :class:`Store`, later calls only read appended rows."""
+        new = _read(self.snapshots_path, ROW, len(self._rows) * ROW.size)
+        if new is None:
+            self._rows, self._last, self._folded = [], {}, 0
+            new = _read(self.snapshots_path, ROW)
+        self._rows.extend(new)
+        return self._rows
+
+    def runs(self):
+        return [ts for (ts,) in _read(self.runs_path, RUN)]
+
+    def partial_runs(self):
+        return {ts for (ts,) in _read(self.partial_path, RUN)}
+
+    def details(self):
+        found = {}
+        try:
+            with open(self.details_path, encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        item = json.loads(line)
+                        found[item["showtime_id"]] = item
+        except FileNotFoundError:
+            pass
+        return found
+
+    def _last_rows(self, at=None):
+        rows = self.rows()
+        if at is not None:
+            return {row[1]: row for row in rows if row[0] <= at}
+        for row in rows[self._folded:]:
+            self._last[row[1]] = row
+        self._folded = len(rows)
+        return self._last
+
+    def latest(self, at=None):
+        """Last row per showtime present in run ``at`` (default: the last run)."""
+        return {sid: row for sid, row in self._last_rows(at).items() if row[2] != GONE}
+
+    def append(self, records, run=None, partial=False):
+        """Add one run's showtime records; returns the number of changed rows written.
+
+        ``records`` is everything the run publishes: showtimes from earlier
+        runs that are missing from it, or failed this time, are marked gone.
+        A ``partial`` run is stored but left out of :meth:`log_history`.
+        """
+        run = int(time.time() if run is None else run)
+        last = self._last_rows()
+        details = self.details()
+        rows, new_details, present = [], [], set()
+        for r in records:
+            sid = r.get("showtime_id")
+            if sid is None or "error" in r:
+                continue
+            present.add(sid)
+            values = (
+                r["totalSeatSold"], r["totalSeatCount"], r["totalAvailableSeatCount"],
+                r["grossRevenueUSD"], r["totalRevenueWithFee"], r["adultTicketPrice"], r["fee"],
+            )
+            previous = last.get(sid)
+            if previous is None or previous[2] == GONE or _changed(previous[2:], values):
+                rows.append(ROW.pack(run, sid, *values))
+            detail = {"showtime_id": sid, **{k: r.get(k) for k in DETAIL_FIELDS}}
+            if details.get(sid) != detail:
+                new_details.append(detail)
+        for sid, row in last.items():
+            if row[2] != GONE and sid not in present:
+                rows.append(ROW.pack(run, sid, GONE, 0, 0, 0, 0, 0, 0))
+        os.makedirs(self.dir, exist_ok=True)
+        if new_details:
+            with open(self.details_path, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(d, ensure_ascii=False) + "\n" for d in new_details)
+        with open(self.snapshots_path, "ab") as f:
+            f.write(b"".join(rows))
+        with open(self.runs_path, "ab") as f:
+            f.write(RUN.pack(run))
+        if partial:
+            with open(self.partial_path, "ab") as f:
+                f.write(RUN.pack(run))
+        return len(rows)
+
+    # -- queries -----------------------------------------------------------
+
+    def legacy_logs(self):
+        return load_json(self.legacy_logs_path, [])
+
+    def sold_over_time(self, showtime_id):
+        """``[(run, sold)]`` for one showtime, one point per change while it was listed."""
+        return [(row[0], row[2]) for row in self.rows() if row[1] == showtime_id and row[2] != GONE]
+
+    def gross_at(self, at):
+        """National gross (without fees) as of run ``at``."""
+        return round(sum(row[5] for row in self.latest(at).values()), 2)
+
+    def records_at(self, at=None):
+        """``main.json``-style records of the showtimes present in run ``at`` (default: the last run)."""
+        details = self.details()
+        return [_record(row, details.get(sid, {})) for sid, row in self.latest(at).items()]
+
+    def log_history(self):
+        """One ``logs.json`` entry per complete stored run, in a single pass over the rows."""
+        details = self.details()
+        partial = self.partial_runs()
+        rows = sorted(self.rows(), key=lambda row: row[0])
+        current = {}
+        entries = []
+        i = 0
+        for run in self.runs():
+            while i < len(rows) and rows[i][0] <= run:
+                row = rows[i]
+                if row[2] == GONE:
+                    current.pop(row[1], None)
+                else:
+                    current[row[1]] = _record(row, details.get(row[1], {}))
+                i += 1
+            if run in partial:
+                continue
+            cols = Columns(list(current.values()), keys=[DIMENSIONS["theater"]])  # venues only
+            entries.append(log_entry(cols, datetime.fromtimestamp(run, LOG_TZ)))
+        return entries
+
+
+def _record(row, detail):
+    values = dict(zip(FIELDS, row))
+    return {
+        **{k: detail.get(k) for k in DETAIL_FIELDS[:6]},
+        "showtime_id": values["showtime_id"],
+        **{k: detail.get(k) for k in DETAIL_FIELDS[6:]},
+        "totalSeatSold": values["sold"],
+        "occupancy": round(100 * values["sold"] / values["capacity"], 2) if values["capacity"] else 0.0,
+        "totalAvailableSeatCount": values["available"],
+        "totalSeatCount": values["capacity"],
+        "grossRevenueUSD": round(values["gross"], 2),
+        "adultTicketPrice": round(values["price"], 2),
+        "fee": round(values["fee"], 2),
+        "totalRevenueWithFee": round(values["gross_with_fee"], 2),
+    }
+
+
+def _changed(old, new):
+    return any(abs(a - b) > 0.005 for a, b in zip(old, new))
+
+
+def _log_time(entry):
+    return datetime.strptime(entry["time"], TIME_FORMAT).replace(tzinfo=LOG_TZ).timestamp()
+
+
+def write_views(folder, store=None):
+    """Regenerate ``main.json``, ``grouped.json``, ``breakdowns.json`` and ``logs.json`` from the store.
+
+    Failed seat maps of the last run come from ``errors.json``; ``logs.json``
+    is the pre-store history followed by one entry per stored run.
+    """
+    store = store or Store(folder)
+    runs = store.runs()
+    if not runs:
+        return
+    errors = load_json(os.path.join(folder, "errors.json"), {}).get("errors", [])
+    logs = store.legacy_logs() + store.log_history()
+    write_reports(folder, store.records_at() + errors, logs, datetime.fromtimestamp(runs[-1], LOG_TZ))
+
+
+def publish(folder, results, run=None, partial=False):
+    """Store one run's records and write ``errors.json`` and the JSON views for ``folder``."""
+    store = Store(folder)
+    with METRICS.stage("store"):
+        store.append(results, run, partial)
+    write_errors(folder, results)
+    write_views(folder, store)
+
+
+def import_main(folder, store=None):
+    """Append the folder's current ``main.json`` as a run, timed by the last ``logs.json`` entry.
+
+    The first import also keeps the earlier ``logs.json`` entries as the
+    store's legacy history.
+    """
+    store = store or Store(folder)
+    logs = load_json(os.path.join(folder, "logs.json"), [])
+    run = _log_time(logs[-1]) if logs else None
+    if not store.runs() and len(logs) > 1:
+        write_json(store.legacy_logs_path, logs[:-1])
+    return store.append(load_json(os.path.join(folder, "main.json"), []), run)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    imp = sub.add_parser("import", help="append the current main.json as a run (timed by the last logs.json entry)")
+    imp.add_argument("folder")
+    views = sub.add_parser("views", help="regenerate main/grouped/breakdowns/logs JSON from the store")
+    views.add_argument("folders", nargs="+")
+    sold = sub.add_parser("sold", help="seats sold over time for one showtime")
+    sold.add_argument("folder")
+    sold.add_argument("showtime_id", type=int)
+    gross = sub.add_parser("gross", help="national gross as of a run timestamp")
+    gross.add_argument("folder")
+    gross.add_argument("at", type=int, nargs="?", default=None)
+    args = parser.parse_args()
+
+    if args.cmd == "views":
+        for folder in args.folders:
+            write_views(folder)
+        return
+    store = Store(args.folder)
+    if args.cmd == "import":
+        print(f"stored {import_main(args.folder, store)} rows")
+    elif args.cmd == "sold":
+        for run, count in store.sold_over_time(args.showtime_id):
+            print(datetime.fromtimestamp(run, LOG_TZ).strftime(TIME_FORMAT), count)
+    else:
+        at = args.at if args.at is not None else (store.runs() or [None])[-1]
+        print(store.gross_at(at))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+import os
+import sys
+
+# The modules live flat at the repo root, next to usa.py.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def record(sid=1, sold=10, theater="AMC Lincoln Square 13", capacity=100, price=15.0, fee=2.0, **fields):
+    """A ``main.json`` showtime record; ``fields`` override or add any other field."""
+    return {
+        "state": "NY", "city": "New York", "zip": "10023", "theater_name": theater, "chainName": "AMC",
+        "chainCode": "AMC", "showtime_id": sid, "date": "2026-03-18+19:00", "format": "Standard",
+        "language": "Hindi", "totalSeatSold": sold, "occupancy": round(100 * sold / capacity, 2) if capacity else 0.0,
+        "totalAvailableSeatCount": capacity - sold, "totalSeatCount": capacity, "grossRevenueUSD": sold * price,
+        "adultTicketPrice": price, "fee": fee, "totalRevenueWithFee": sold * (price + fee), **fields,
+    }
@@ -0,0 +1,28 @@
+from aggregate import Columns, breakdowns
+from conftest import record
+
+
+ROWS = [
+    record(theater="AMC TX", chainName="AMC", state="TX", city="X", sold=10, capacity=100, price=15),
+    record(theater="Regal TX", chainName="Regal", state="TX", city="X", sold=5, capacity=50, price=12),
+    record(theater="AMC CA", chainName="AMC", state="CA", city="X", sold=1, capacity=10, price=20),
+]
+
+
+def test_group_sums_matches_per_record_totals():
+    cols = Columns(ROWS)
+    labels, counts, (sold, gross) = cols.group_sums(("chainName",), ("sold", "gross"))
+    assert labels == [("AMC",), ("Regal",)]
+    assert counts == [2, 1]
+    assert sold == [11, 5]
+    assert gross == [170, 60]
+    state = breakdowns(cols)["state"]
+    assert list(state) == ["TX", "CA"]
+    assert state["TX"]["avg_occupancy"] == 10.0
+
+
+def test_one_pass_breakdowns_match_per_dimension_group_sums():
+    cols = Columns(ROWS)
+    together = cols.group_sums_by([("chainName",), ("state", "city")])
+    assert together[("chainName",)] == cols.group_sums(("chainName",))
+    assert together[("state", "city")] == cols.group_sums(("state", "city"))
@@ -0,0 +1,74 @@
+import json
+import os
+import threading
+import time
+
+from checkpoint import Checkpoint
+
+TARGETS = [("244687", "2026-03-18")]
+TARGET = ("244687", "2026-03-18")
+
+
+def write_lines(path, entries, tail=""):
+    path.write_text("".join(json.dumps(e) + "\n" for e in entries) + tail)
+
+
+def header(started=None, targets=TARGETS):
+    return {"type": "run", "started": time.time() if started is None else started,
+            "targets": sorted([m, d] for m, d in targets)}
+
+
+def test_resume_ignores_torn_last_line(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    write_lines(path, [
+        header(),
+        {"type": "zip", "zip": "10023", "theaters": [{"theater_name": "AMC Lincoln Square 13"}]},
+        {"type": "record", "movie_id": "244687", "date": "2026-03-18", "fetched": 1_773_000_000.0,
+         "record": {"showtime_id": 7, "totalSeatSold": 3}},
+    ], tail='{"type": "listing", "theater": "AMC:AMC Linc')
+    cp = Checkpoint(str(path), TARGETS)
+    assert cp.resumed
+    assert list(cp.zips) == ["10023"]
+    assert cp.record_for(TARGET, 7) == {"showtime_id": 7, "totalSeatSold": 3}
+    assert cp.fetched_at(TARGET, 7) == 1_773_000_000.0
+    assert cp.listings == {}
+    # The torn line is gone, so the next append starts on a line of its own.
+    cp.add_listing("AMC:AMC Lincoln Square 13", "2026-03-18", [])
+    cp.close()
+    assert [json.loads(line)["type"] for line in path.read_text().splitlines()] == ["run", "zip", "record", "listing"]
+
+
+def test_other_targets_start_over(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    write_lines(path, [header(targets=[("244612", "2026-03-18")]), {"type": "zip", "zip": "10023", "theaters": []}])
+    cp = Checkpoint(str(path), TARGETS)
+    assert not cp.resumed
+    assert cp.zips == {}
+    cp.close()
+    assert [json.loads(line) for line in path.read_text().splitlines()][0]["targets"] == [list(TARGET)]
+
+
+def test_expired_checkpoint_starts_over(tmp_path):
+    path = tmp_path / "checkpoint.jsonl"
+    write_lines(path, [header(started=time.time() - 4 * 3600), {"type": "zip", "zip": "10023", "theaters": []}])
+    assert not Checkpoint(str(path), TARGETS, max_age_hours=3).resumed
+    assert Checkpoint(str(path), TARGETS, max_age_hours=3).resumed  # the fresh header just written
+
+
+def test_appends_are_fsynced_off_the_calling_thread(tmp_path, monkeypatch):
+    path = tmp_path / "checkpoint.jsonl"
+    cp = Checkpoint(str(path), TARGETS)
+    synced_on = []
+    fsync = os.fsync
+
+    def recording_fsync(fd):
+        synced_on.append(threading.current_thread())
+        fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", recording_fsync)
+    cp.add_zip("10023", [])
+    cp.flush()
+    cp._syncing.result()
+    assert synced_on and threading.current_thread() not in synced_on
+    cp.close()
+    assert [json.loads(line)["type"] for line in path.read_text().splitlines()] == ["run", "zip"]
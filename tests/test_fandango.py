@@ -0,0 +1,80 @@
+import asyncio
+
+import pytest
+
+import fandango
+from fandango import FandangoSource, language, to_listing, to_seats
+from pipeline import FetchError
+
+THEATER = {
+    "id": "AAUYL", "name": "Regal Solomon Pond", "chainCode": "REGL", "chainName": "Regal", "state": "MA",
+    "city": "Marlborough", "zip": "01752",
+    "movies": [{"id": 244687, "variants": [
+        {"formatName": "RPX", "amenityGroups": [
+            {"amenities": [{"name": "Reserved Seating"}, {"name": "Telugu w/English subtitles"}],
+             "showtimes": [{"id": 1, "ticketingDate": "2026-03-18+19:10"}, {"id": 2, "ticketingDate": "2026-03-19+00:30"}]},
+        ]},
+        {"amenityGroups": [{"showtimes": [{"id": 3, "ticketingDate": "2026-03-18+21:00"}]}]},
+    ]}],
+}
+
+
+def seat_map(tickets, total=100, available=90):
+    return {"data": {"areas": [{"ticketInfo": tickets}], "totalSeatCount": total, "totalAvailableSeatCount": available}}
+
+
+def test_language_is_the_first_listed_language():
+    assert language([{"name": "Closed Caption"}, {"name": "hindi w/English subtitles"}]) == "Hindi"
+    assert language([{"name": "Spanglish"}]) == "Unknown"
+    assert language(None) == "Unknown"
+
+
+def test_listing_flattens_variants_and_keeps_late_shows():
+    assert to_listing(THEATER) == [
+        {"movie_id": "244687", "showtime_id": 1, "date": "2026-03-18+19:10", "format": "RPX", "language": "Telugu"},
+        {"movie_id": "244687", "showtime_id": 2, "date": "2026-03-19+00:30", "format": "RPX", "language": "Telugu"},
+        {"movie_id": "244687", "showtime_id": 3, "date": "2026-03-18+21:00", "format": "Standard",
+         "language": "Unknown"},
+    ]
+
+
+def test_seats_price_the_adult_ticket():
+    seats = to_seats(seat_map([{"desc": "Child", "price": 9.0, "fee": 1.0}, {"desc": "ADULT (18+)", "price": 15.5,
+                                                                             "fee": 2.25}]))
+    assert seats == {"totalSeatCount": 100, "totalAvailableSeatCount": 90, "adultTicketPrice": 15.5, "fee": 2.25}
+    assert to_seats(seat_map([{"desc": "General Admission", "price": 12.0}]))["adultTicketPrice"] == 12.0
+
+
+@pytest.mark.parametrize("payload, reason", [
+    ({"error": "Showtime not found"}, "No areas"),
+    (seat_map([{"desc": "Adult", "price": 15.5}], total=0, available=0), "No seats"),
+    (seat_map([]), "No ticket info"),
+    (seat_map([{"desc": "Adult"}]), "Ticket price 0"),
+])
+def test_seat_map_errors_match_usa_py(payload, reason):
+    with pytest.raises(FetchError) as exc:
+        to_seats(payload)
+    assert (exc.value.status, exc.value.reason) == (500, reason)
+
+
+def test_theaters_in_one_zip_share_a_listing_request(monkeypatch):
+    calls = []
+
+    async def theaters_near(self, session, zip_code, date):
+        calls.append((zip_code, date))
+        await asyncio.sleep(0)
+        return [THEATER]
+
+    monkeypatch.setattr(FandangoSource, "theaters_near", theaters_near)
+    source = FandangoSource()
+    regal = fandango.to_theater(THEATER)
+    unknown = {**regal, "theater_id": "OTHER", "theater_name": "Somewhere Else"}
+
+    async def sweep():
+        found = await asyncio.gather(*(source.showtimes(None, regal, "2026-03-18") for _ in range(3)))
+        with pytest.raises(FetchError):
+            await source.showtimes(None, unknown, "2026-03-18")
+        return found
+
+    assert [len(listing) for listing in asyncio.run(sweep())] == [3, 3, 3]
+    assert calls == [("01752", "2026-03-18")]
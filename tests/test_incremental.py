@@ -0,0 +1,71 @@
+import json
+import math
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+from conftest import record
+from incremental import RefreshState, select_due, show_start
+from theater_index import theater_key
+
+START = datetime(2026, 3, 18, 19, 0, tzinfo=ZoneInfo("America/New_York")).timestamp()
+HOUR = 3600
+
+
+def state(tmp_path, records, history, now):
+    (tmp_path / "main.json").write_text(json.dumps(records))
+    (tmp_path / "refresh.json").write_text(json.dumps(history))
+    return RefreshState(str(tmp_path), now=now)
+
+
+def test_show_start_uses_split_state_zones():
+    memphis = {"date": "2026-03-18+19:00", "state": "TN", "city": "Memphis"}
+    knoxville = {"date": "2026-03-18+19:00", "state": "TN", "city": "Knoxville"}
+    assert show_start(memphis) == START + HOUR
+    assert show_start(knoxville) == START
+
+
+def test_priority(tmp_path):
+    now = START - 24 * HOUR
+    s = state(tmp_path, [
+        record(1), record(2, totalAvailableSeatCount=0), record(3), record(4, error={"status": 500}),
+    ], {"1": {"fetched": now - 6 * HOUR, "sold": 10, "velocity": 0.0}, "2": {"fetched": now, "sold": 100}}, now)
+    assert s.priority(1) == 6 / 6  # 24 hours left -> refreshed every 6 hours
+    assert s.priority(2) is None  # sold out
+    assert s.priority(3) == math.inf  # never fetched
+    assert s.priority(4) == math.inf  # previous error
+    assert s.priority(5) == math.inf  # new show
+    s.now = START + 60
+    assert s.priority(1) is None  # started
+
+
+def test_select_due_budget_prefers_never_fetched(tmp_path):
+    now = START - 24 * HOUR
+    history = {"1": {"fetched": now - 12 * HOUR, "sold": 10}, "2": {"fetched": now - 7 * HOUR, "sold": 10},
+               "3": {"fetched": now - HOUR, "sold": 10}}
+    s = state(tmp_path, [record(1), record(2), record(3)], history, now)
+    candidates = [("t", sid) for sid in (1, 2, 3, 4)]
+    assert select_due(candidates, {"t": s}, budget=None) == {("t", 1), ("t", 2), ("t", 4)}
+    assert select_due(candidates, {"t": s}, budget=2) == {("t", 4), ("t", 1)}
+
+
+def test_carried_keeps_unlisted_theaters(tmp_path):
+    now = START - 24 * HOUR
+    s = state(tmp_path, [
+        record(1), record(2), record(3, theater="Regal Union Square"),
+        record(4, theater="Regal Union Square", error={}), record(5, date="2026-03-17+19:00"),
+    ], {}, now)
+    kept = {r["showtime_id"] for r in s.carried({1}, {theater_key(record(1))})}
+    # 2 was delisted, 3 is at a theater without a listing this run, 4 is an error, 5 already started.
+    assert kept == {1, 3, 5}
+
+
+def test_record_fetched_keeps_checkpoint_fetch_time(tmp_path):
+    now = START - 24 * HOUR
+    history = {"1": {"fetched": now - 4 * HOUR, "sold": 10, "velocity": 0.0},
+               "2": {"fetched": now - 4 * HOUR, "sold": 10, "velocity": 0.0}}
+    s = state(tmp_path, [record(1), record(2)], history, now)
+    s.record_fetched([record(1, sold=30), record(2, sold=30)], {1: now - 2 * HOUR})
+    assert s.history[1] == {"fetched": now - 2 * HOUR, "sold": 30, "velocity": 5.0}  # 20 seats in 2 hours
+    assert s.history[2] == {"fetched": now, "sold": 30, "velocity": 2.5}  # 20 seats in 4 hours
+    s.record_fetched([record(1, sold=30)], {1: now - 2 * HOUR})  # resumed again: nothing new
+    assert s.history[1]["fetched"] == now - 2 * HOUR
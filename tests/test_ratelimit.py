@@ -0,0 +1,81 @@
+import pytest
+
+import ratelimit
+from ratelimit import AIMDLimiter, HostSettings
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(ratelimit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def limiter(initial=8, maximum=16):
+    return AIMDLimiter("example.com", HostSettings(initial=initial, maximum=maximum, keepalive=30))
+
+
+def test_grows_about_one_per_round_trip_up_to_maximum(clock):
+    aimd = limiter(initial=8, maximum=9)
+    for _ in range(8):
+        aimd.record(200, 0.1)
+    assert aimd.limit == pytest.approx(9, abs=0.1)
+    for _ in range(50):
+        aimd.record(200, 0.1)
+    assert aimd.limit == 9
+
+
+def test_slow_responses_stop_growth(clock):
+    aimd = limiter()
+    aimd.record(200, 0.1)
+    before = aimd.limit
+    for _ in range(20):
+        aimd.record(200, 2.0)
+    assert aimd.limit == before
+
+
+@pytest.mark.parametrize("status", [429, 503, None])
+def test_throttling_halves_once_per_round_trip(clock, status):
+    aimd = limiter()
+    aimd.record(200, 0.5)
+    aimd.record(status, 0.5)
+    aimd.record(status, 0.5)  # in flight before the first decrease took effect
+    assert aimd.limit == pytest.approx(4, abs=0.2)
+    clock[0] += 1
+    aimd.record(status, 0.5)
+    assert aimd.limit == pytest.approx(2, abs=0.1)
+
+
+def test_retry_after_pauses_the_host(clock):
+    aimd = limiter()
+    aimd.record(429, 0.1, retry_after=5)
+    assert aimd.paused_until == 1005
+
+
+def test_lone_500_is_not_throttling(clock):
+    aimd = limiter()
+    aimd.record(200, 0.1)
+    before = aimd.limit
+    aimd.record(500, 0.1)
+    assert aimd.limit == before
+    assert aimd.counts["failed"] == 1
+
+
+def test_steady_500s_never_back_off(clock):
+    aimd = limiter()
+    for _ in range(50):
+        clock[0] += 1
+        aimd.record(500, 0.1)
+    assert aimd.error_rate == 0
+    assert aimd.limit == 8
+    assert aimd.counts["failed"] == 50
+
+
+@pytest.mark.parametrize("status", [502, 504])
+def test_sustained_gateway_errors_back_off(clock, status):
+    aimd = limiter()
+    for _ in range(10):
+        clock[0] += 1
+        aimd.record(status, 0.1)
+    assert aimd.error_rate > ratelimit.ERROR_RATE_LIMIT
+    assert aimd.limit < 8
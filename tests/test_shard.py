@@ -0,0 +1,88 @@
+import asyncio
+import json
+import time
+
+import pipeline
+import shard
+from conftest import record
+from shard import Shard, dedupe, merge_history
+
+TARGET = pipeline.Target("244687", "2026-03-18")
+
+
+def test_dedupe_prefers_seats_over_errors():
+    error = record(2, error={"status": 500})
+    merged = dedupe([[record(1, 5), error], [record(1, 9), record(2, 3)], [record(None)]])
+    assert sorted(merged, key=lambda r: r["showtime_id"] or 0) == [record(None), record(1, 5), record(2, 3)]
+
+
+def test_merge_history_keeps_latest_fetch():
+    merged = merge_history([
+        {"1": {"fetched": 100, "sold": 1}, "2": {"fetched": 300, "sold": 7}},
+        {"1": {"fetched": 200, "sold": 4}},
+        {"2": {"fetched": 250, "sold": 6}, "3": {"fetched": 50, "sold": 0}},
+    ])
+    assert merged == {"1": {"fetched": 200, "sold": 4}, "2": {"fetched": 300, "sold": 7}, "3": {"fetched": 50, "sold": 0}}
+
+
+def _theater(name, theater_id=0):
+    return {"theater_id": str(theater_id), "theater_name": name, "chainCode": "X"}
+
+
+def _owned(count, index, names):
+    return next(n for n in names if Shard(index, count, "hash").owns_theater(_theater(n)))
+
+
+class FakeSource:
+    def __init__(self, zips):
+        self.zips = zips
+
+    async def lookup_theaters(self, session, zip_code):
+        return self.zips[zip_code]
+
+    async def showtimes(self, session, theater, date):
+        sid = int(theater["theater_id"])
+        return [{"movie_id": TARGET.movie_id, "showtime_id": sid, "date": f"{date}+19:00"}]
+
+    async def seat_map(self, session, theater, showtime):
+        return {"totalSeatCount": 100, "totalAvailableSeatCount": 90, "adultTicketPrice": 15.0, "fee": 2.0}
+
+
+def test_shards_sweep_theaters_only_their_zips_found(tmp_path, monkeypatch):
+    monkeypatch.setattr(shard, "SHARDS_DIR", str(tmp_path / "shards"))
+    monkeypatch.setattr(pipeline, "ZIPCODES_FILE", str(tmp_path / "none.txt"))
+    zip_a, zip_b = [z for z in (f"{n:05d}" for n in range(100)) if Shard(1, 2, "hash").owns_zip(z)][:2]
+    names = [f"Cinema {n}" for n in range(100)]
+    known, new = _owned(2, 0, names), _owned(2, 0, names[::-1])
+    # Both theaters belong to shard 0, but only shard 1's zips find them: the
+    # shared index already knows one of them, the other is new this run.
+    index_path = tmp_path / "theaters.json"
+    index_path.write_text(json.dumps({
+        "zips": {zip_a: {"checked": time.time(), "theaters": [f"X:{known}"]}, zip_b: {"checked": 0, "theaters": []}},
+        "theaters": {f"X:{known}": _theater(known, 1)},
+    }))
+    source = FakeSource({zip_b: [_theater(known, 1), _theater(new, 2)]})
+    swept = {}
+    for i in range(2):
+        s = Shard(i, 2, "hash")
+        assert asyncio.run(pipeline.run(source, [TARGET], str(index_path), resume=False, shard=s))
+        main = json.loads((tmp_path / "shards" / f"{i}-of-2" / "244687" / "20260318" / "main.json").read_text())
+        swept[i] = sorted(r["showtime_id"] for r in main)
+    assert swept == {0: [1], 1: [2]}
+
+
+def test_shards_split_the_refresh_budget(tmp_path, monkeypatch):
+    monkeypatch.setattr(shard, "SHARDS_DIR", str(tmp_path / "shards"))
+    monkeypatch.setattr(pipeline, "ZIPCODES_FILE", str(tmp_path / "none.txt"))
+    monkeypatch.setattr(pipeline, "REFRESH_BUDGET", 1000)
+    budgets = []
+
+    async def sweep(session, source, theaters, targets, states, checkpoint, deadline, budget):
+        budgets.append(budget)
+        return {}, True
+
+    monkeypatch.setattr(pipeline, "sweep", sweep)
+    index_path = str(tmp_path / "theaters.json")
+    for s in (None, Shard(0, 3, "hash")):
+        assert asyncio.run(pipeline.run(FakeSource({}), [TARGET], index_path, resume=False, shard=s))
+    assert budgets == [1000, 334]
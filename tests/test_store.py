@@ -0,0 +1,63 @@
+import json
+import os
+
+from common import load_json
+from conftest import record
+from store import GONE, Store, write_views
+
+
+def test_views_follow_presence(tmp_path):
+    store = Store(str(tmp_path))
+    store.append([record(1, 10), record(2, 20), record(3, 30)], run=100)
+    failed = {**record(2, 0), "error": {"status": 500, "reason": "No areas"}}
+    for key in ("totalSeatSold", "totalSeatCount"):
+        failed.pop(key)
+    assert store.append([record(1, 10), record(3, 35), failed], run=200) == 2  # 3 changed, 2 gone
+    assert [r["showtime_id"] for r in store.records_at()] == [1, 3]
+    assert [r["showtime_id"] for r in store.records_at(100)] == [1, 2, 3]
+    assert [e["total_shows"] for e in store.log_history()] == [3, 2]
+    assert store.gross_at(200) == 675.0
+
+    store.append([record(1, 10), record(2, 20), record(3, 35)], run=300)  # back again, unchanged
+    assert sorted(r["showtime_id"] for r in store.records_at()) == [1, 2, 3]
+    assert store.sold_over_time(2) == [(100, 20), (300, 20)]
+    assert sum(row[2] == GONE for row in store.rows()) == 1
+
+
+def test_views_keep_legacy_logs(tmp_path):
+    folder = str(tmp_path)
+    store = Store(folder)
+    store.append([record(1, 10)], run=1_772_000_000)
+    legacy = [{"time": "2026-02-01 10:00:00 AM", "total_shows": 7}]
+    with open(os.path.join(store.dir, "legacy_logs.json"), "w") as f:
+        json.dump(legacy, f)
+    write_views(folder)
+    logs = load_json(os.path.join(folder, "logs.json"))
+    assert logs[0] == legacy[0]
+    assert [e["total_shows"] for e in logs[1:]] == [1]
+    assert [r["showtime_id"] for r in load_json(os.path.join(folder, "main.json"))] == [1]
+
+
+def test_partial_runs_have_no_log_entry(tmp_path):
+    store = Store(str(tmp_path))
+    store.append([record(1, 10)], run=100)
+    store.append([record(1, 12), record(2, 5)], run=200, partial=True)
+    store.append([record(1, 15), record(2, 5), record(3, 1)], run=300)
+    assert sorted(r["showtime_id"] for r in store.records_at(200)) == [1, 2]
+    assert [e["total_shows"] for e in store.log_history()] == [1, 3]
+
+
+def test_rows_are_decoded_once_and_follow_appends(tmp_path):
+    folder = str(tmp_path)
+    reader = Store(folder)
+    Store(folder).append([record(1, 10), record(2, 20)], run=100)
+    assert [r["showtime_id"] for r in reader.records_at()] == [1, 2]
+    decoded = reader.rows()[0]
+    Store(folder).append([record(1, 12)], run=200)  # 1 changed, 2 gone
+    assert reader.rows()[0] is decoded
+    assert reader.rows() == Store(folder).rows()
+    assert [r["showtime_id"] for r in reader.records_at()] == [1]
+
+    os.remove(Store(folder).snapshots_path)  # replaced behind the reader's back
+    Store(folder).append([record(3, 1)], run=300)
+    assert reader.rows() == Store(folder).rows()
@@ -0,0 +1,50 @@
+from theater_index import TheaterIndex, seed_from_main, theater_key
+
+REGAL = {"theater_id": "1234", "theater_name": "Regal Solomon Pond", "chainCode": "REG", "state": "MA",
+         "city": "Marlborough", "zip": "01752"}
+RECORD = {"theater_name": "Regal Solomon Pond", "chainCode": "REG", "state": "MA", "city": "Marlborough",
+          "zip": "01752", "showtime_id": 1}
+
+
+def test_lookup_and_record_share_a_key():
+    assert theater_key(REGAL) == theater_key(RECORD) == "REG:Regal Solomon Pond:MA:Marlborough"
+
+
+def test_same_name_in_another_town_is_another_theater(tmp_path):
+    index = TheaterIndex(tmp_path / "theaters.json")
+    other = {**REGAL, "theater_id": "5678", "state": "TX", "city": "Austin", "zip": "78701"}
+    index.update("01752", [REGAL, other], now=10)
+    assert [t["theater_id"] for t in index.all_theaters()] == ["1234", "5678"]
+
+
+def test_index_files_are_world_readable(tmp_path):
+    index = TheaterIndex(str(tmp_path / "theaters.json"))
+    index.save()
+    assert (tmp_path / "theaters.json").stat().st_mode & 0o044 == 0o044
+
+
+def test_cold_index_looks_up_every_zip_despite_limit(tmp_path):
+    index = TheaterIndex(tmp_path / "theaters.json")
+    zips = [f"{n:05d}" for n in range(50)]
+    assert index.stale_zips(zips, limit=10) == zips
+
+
+def test_limit_only_caps_expired_zips(tmp_path):
+    index = TheaterIndex(tmp_path / "theaters.json", ttl_hours=1)
+    for n, zip_code in enumerate(["00001", "00002", "00003"]):
+        index.update(zip_code, [], now=1000 + n)
+    stale = index.stale_zips(["00001", "00002", "00003", "00004"], now=1_000_000, limit=1)
+    assert stale == ["00004", "00001"]
+
+
+def test_seeded_theater_merges_with_lookup(tmp_path):
+    path = tmp_path / "main.json"
+    path.write_text('[{"theater_name": "Regal Solomon Pond", "chainCode": "REG", "state": "MA", "city": "Marlborough",'
+                    ' "zip": "01752"}]')
+    index = TheaterIndex(tmp_path / "theaters.json")
+    seed_from_main(index, [path])
+    assert index.stale_zips(["01752"], now=0) == ["01752"]  # seeded zips still get a real lookup
+    index.update("01752", [REGAL], now=10)
+    index.update("01760", [REGAL], now=10)
+    assert index.all_theaters() == [{**{k: REGAL[k] for k in ("theater_name", "chainCode", "state", "city", "zip")},
+                                     "theater_id": "1234"}]
@@ -0,0 +1,187 @@
+"""Persistent zip -> theater index.
+
+The national sweep used to look up theaters around every zip in
+``zipcodes.txt`` on every run, even though only a few hundred theaters ever
+show up and most zips return the same overlapping radius results.  The index
+keeps the last lookup for each zip in ``data/theaters.json`` and only
+re-queries zips whose entry is older than the TTL, so an hourly run can go
+straight from the cached theater set to showtime and seat-map fetches.
+
+Zips that were never looked up (a cold index, new lines in ``zipcodes.txt``
+or entries seeded from ``main.json``) are always looked up, so the first run
+covers every zip; ``limit`` only spreads the re-checks of expired zips.
+
+    python theater_index.py seed data/*/*/main.json
+    python theater_index.py stale --limit 300
+    python theater_index.py stats
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+import zlib
+
+from common import DATA_DIR, load_json, read_zipcodes, write_json
+
+log = logging.getLogger(__name__)
+
+INDEX_PATH = os.path.join(DATA_DIR, "theaters.json")
+TTL_HOURS = float(os.getenv("THEATER_INDEX_TTL_HOURS", 24 * 7))
+# Zips are spread over +/- this fraction of the TTL so they don't all expire
+# in the same run after a full seed.
+TTL_SPREAD = 0.2
+THEATER_FIELDS = ("theater_id", "theater_name", "chainName", "chainCode", "state", "city", "zip")
+
+
+def theater_key(theater):
+    """Stable identity for a theater: chain, name, state and city.
+
+    Lookups and ``main.json`` records both carry these (records have no
+    ``theater_id``), so a theater gets the same key however it was found,
+    and two same-named theaters of a chain in different towns stay apart.
+    """
+    return ":".join((theater.get("chainCode") or "", theater["theater_name"],
+                     theater.get("state") or "", theater.get("city") or ""))
+
+
+class TheaterIndex:
+    def __init__(self, path=INDEX_PATH, ttl_hours=TTL_HOURS):
+        self.path = path
+        self.ttl = ttl_hours * 3600
+        self.zips = {}  # zip -> {"checked": epoch seconds, "theaters": [key, ...]}
+        self.theaters = {}  # key -> theater dict (first zip it was seen from)
+
+    @classmethod
+    def load(cls, path=INDEX_PATH, ttl_hours=TTL_HOURS):
+        index = cls(path, ttl_hours)
+        data = load_json(path, {})
+        index.zips = data.get("zips", {})
+        index.theaters = data.get("theaters", {})
+        return index
+
+    def save(self):
+        write_json(self.path, {"zips": self.zips, "theaters": self.theaters})
+
+    def _ttl_for(self, zip_code):
+        spread = (zlib.crc32(zip_code.encode()) % 1000) / 1000  # 0..1, deterministic per zip
+        return self.ttl * (1 - TTL_SPREAD + 2 * TTL_SPREAD * spread)
+
+    def is_new(self, zip_code):
+        """Never looked up upstream: unknown, or only seeded from ``main.json``."""
+        entry = self.zips.get(zip_code)
+        return entry is None or not entry["checked"]
+
+    def is_stale(self, zip_code, now=None):
+        if self.is_new(zip_code):
+            return True
+        entry = self.zips[zip_code]
+        now = time.time() if now is None else now
+        return now - entry["checked"] >= self._ttl_for(zip_code)
+
+    def stale_zips(self, zips, now=None, limit=None):
+        """Zips that need a fresh lookup: every never-seen zip, then up to ``limit`` expired ones, oldest first."""
+        new = [z for z in zips if self.is_new(z)]
+        expired = [z for z in zips if not self.is_new(z) and self.is_stale(z, now)]
+        expired.sort(key=lambda z: self.zips[z]["checked"])
+        return new + (expired[:limit] if limit else expired)
+
+    def update(self, zip_code, theaters, now=None):
+        """Record a lookup result for ``zip_code``, merging theaters already known from other zips."""
+        keys = []
+        for theater in theaters:
+            key = theater_key(theater)
+            known = self.theaters.setdefault(key, {})
+            for f in THEATER_FIELDS:  # fills in e.g. the theater_id of a theater seeded from main.json
+                if theater.get(f) is not None and known.get(f) is None:
+                    known[f] = theater[f]
+            if key not in keys:
+                keys.append(key)
+        self.zips[zip_code] = {"checked": time.time() if now is None else now, "theaters": keys}
+
+    def active_zips(self):
+        """Zips whose last lookup returned at least one theater."""
+        return [z for z, entry in self.zips.items() if entry["theaters"]]
+
+    def all_theaters(self):
+        """Every known theater exactly once, however many zips' radius results it appeared in."""
+        seen = set()
+        for entry in self.zips.values():
+            seen.update(entry["theaters"])
+        return [self.theaters[k] for k in self.theaters if k in seen]
+
+
+async def refresh(index, zips, lookup, session, concurrency=20, limit=None, now=None):
+    """Re-run ``lookup(session, zip)`` for stale zips only and return how many were refreshed.
+
+    A failed lookup keeps the previous entry so a flaky run never empties the index.
+    """
+    stale = index.stale_zips(zips, now, limit)
+    sem = asyncio.Semaphore(concurrency)
+    refreshed = 0
+
+    async def one(zip_code):
+        nonlocal refreshed
+        async with sem:
+            try:
+                theaters = await lookup(session, zip_code)
+            except Exception as exc:
+                log.warning("theater lookup failed for %s: %s", zip_code, exc)
+                return
+        index.update(zip_code, theaters, now)
+        refreshed += 1
+
+    await asyncio.gather(*(one(z) for z in stale))
+    log.info("refreshed %d/%d stale zips (%d known)", refreshed, len(stale), len(zips))
+    return refreshed
+
+
+def seed_from_main(index, paths):
+    """Build index entries from existing ``main.json`` outputs.
+
+    Seeded zips are marked as never checked, so the next run still looks
+    them up and picks up the upstream ``theater_id`` of each theater.
+    """
+    found = {}
+    for path in paths:
+        for record in load_json(path, []):
+            found.setdefault(record["zip"], []).append(record)
+    for zip_code, records in found.items():
+        if index.is_new(zip_code):
+            index.update(zip_code, records, now=0)
+    return len(found)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--index", default=INDEX_PATH)
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    seed = sub.add_parser("seed", help="seed the index from main.json files")
+    seed.add_argument("paths", nargs="+")
+    stale = sub.add_parser("stale", help="print zips due for a fresh lookup")
+    stale.add_argument("--zipcodes", default=None)
+    stale.add_argument("--limit", type=int, default=None)
+    sub.add_parser("zips", help="print zips that have theaters")
+    sub.add_parser("stats")
+    args = parser.parse_args()
+
+    index = TheaterIndex.load(args.index)
+    if args.cmd == "seed":
+        count = seed_from_main(index, args.paths)
+        index.save()
+        print(f"seeded {count} zips, {len(index.all_theaters())} theaters")
+    elif args.cmd == "stale":
+        zips = read_zipcodes(args.zipcodes) if args.zipcodes else read_zipcodes()
+        print("\n".join(index.stale_zips(zips, limit=args.limit)))
+    elif args.cmd == "zips":
+        print("\n".join(index.active_zips()))
+    else:
+        now = time.time()
+        stale = sum(index.is_stale(z, now) for z in index.zips)
+        print(f"{len(index.zips)} zips ({len(index.active_zips())} with theaters, {stale} stale), "
+              f"{len(index.all_theaters())} theaters")
+
+
+if __name__ == "__main__":
+    main()